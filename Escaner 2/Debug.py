@@ -1,113 +1,128 @@
+import argparse
+import os
+import sys
+
 import cv2
-import numpy as np
-from ultralytics import YOLO
-import easyocr
-from card_scanner import load_json_cards, improve_ocr_preprocessing, get_text_class_name
 
-def debug_card_detection(image_path, weights_path, json_path):
-    """Versión de debugging para ver exactamente qué está fallando"""
+from card_scanner import CLASES_MULTILINEA, CardScanner, normalizar_roi, separar_lineas, silencio
+
+UMBRALES = [0.1, 0.2, 0.3, 0.4, 0.5]
+
+def debug_card_detection(image_path, weights_path, json_path, umbrales=UMBRALES, guardar_rois=True):
+    """Versión de debugging para ver exactamente qué está fallando.
+
+    YOLO se ejecuta una sola vez con el umbral más bajo y el conjunto de cajas
+    de cada umbral se obtiene filtrando por confianza en memoria (la NMS nunca
+    deja que una caja de menor confianza elimine a otra de mayor, así que es
+    el mismo resultado que volver a ejecutar el modelo). Cada caja se pasa por
+    OCR una sola vez y el texto se reutiliza en todos los umbrales.
+    """
     print("="*80)
     print("🔍 MODO DEBUG - ANÁLISIS COMPLETO DE DETECCIÓN")
     print("="*80)
-    
-    # Cargar modelo y imagen
-    model = YOLO(weights_path)
+
+    # Cargar modelo, lector, catálogo e imagen
+    scanner = CardScanner(weights_path, json_path, log=silencio)
     image = cv2.imread(image_path)
-    cards = load_json_cards(json_path)
-    reader = easyocr.Reader(['es', 'en'])
-    
+    if image is None:
+        print(f"❌ No se pudo leer la imagen: {image_path}")
+        return None
+
     print(f"📸 Imagen cargada: {image.shape}")
-    print(f"🃏 Cartas en base de datos: {len(cards)}")
-    
-    # Probar con múltiples umbrales
-    for conf_threshold in [0.1, 0.2, 0.3, 0.4, 0.5]:
-        print(f"\n🎯 Probando con umbral de confianza: {conf_threshold}")
-        
-        results = model(image_path, conf=conf_threshold)[0]
-        print(f"📊 Detecciones encontradas: {len(results.boxes) if results.boxes is not None else 0}")
-        
-        if results.boxes is not None and len(results.boxes) > 0:
-            for i, box in enumerate(results.boxes):
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                confidence = float(box.conf[0])
-                class_id = int(box.cls[0]) if hasattr(box, 'cls') else 0
-                class_name = get_text_class_name(class_id)
-                
-                print(f"\n📦 Caja {i+1}:")
-                print(f"   🎯 Confianza: {confidence:.3f}")
-                print(f"   📍 Coordenadas: ({x1}, {y1}) -> ({x2}, {y2})")
-                print(f"   🏷️ Clase: {class_name} (ID: {class_id})")
-                print(f"   📏 Tamaño: {x2-x1}x{y2-y1}")
-                
-                # Extraer ROI
-                h, w = image.shape[:2]
-                pad = 10
-                x1p = max(x1 - pad, 0)
-                y1p = max(y1 - pad, 0)
-                x2p = min(x2 + pad, w)
-                y2p = min(y2 + pad, h)
-                roi = image[y1p:y2p, x1p:x2p]
-                
-                # Guardar ROI para inspección
-                roi_filename = f"debug_roi_{conf_threshold}_{i+1}.jpg"
-                cv2.imwrite(roi_filename, roi)
-                print(f"   💾 ROI guardada: {roi_filename}")
-                
-                # Probar OCR en ROI original
-                print("   🔤 OCR en imagen original:")
-                try:
-                    ocr_result = reader.readtext(roi)
-                    if ocr_result:
-                        for j, (bbox, text, conf) in enumerate(ocr_result):
-                            print(f"      Texto {j+1}: '{text}' (confianza: {conf:.3f})")
-                    else:
-                        print("      ❌ No se detectó texto")
-                except Exception as e:
-                    print(f"      ❌ Error en OCR: {e}")
-                
-                # Probar OCR en ROI mejorada
-                print("   🔤 OCR en imagen mejorada:")
-                try:
-                    improved_roi = improve_ocr_preprocessing(roi)
-                    improved_filename = f"debug_improved_roi_{conf_threshold}_{i+1}.jpg"
-                    cv2.imwrite(improved_filename, improved_roi)
-                    print(f"   💾 ROI mejorada guardada: {improved_filename}")
-                    
-                    ocr_result = reader.readtext(improved_roi)
-                    if ocr_result:
-                        for j, (bbox, text, conf) in enumerate(ocr_result):
-                            print(f"      Texto {j+1}: '{text}' (confianza: {conf:.3f})")
-                    else:
-                        print("      ❌ No se detectó texto")
-                except Exception as e:
-                    print(f"      ❌ Error en OCR mejorado: {e}")
-            
-            break  # Si encontramos detecciones, no probar umbrales más altos
-        else:
-            print("   ❌ No se encontraron detecciones")
-    
-    # Si no se encontraron detecciones, probar OCR en toda la imagen
-    if results.boxes is None or len(results.boxes) == 0:
+    print(f"🃏 Cartas en base de datos: {len(scanner.cards)}")
+
+    umbrales = sorted(umbrales)
+    results = scanner.model(image, conf=umbrales[0], verbose=False)[0]
+    h, w = image.shape[:2]
+    cajas = []
+    for i, box in enumerate(results.boxes if results.boxes is not None else []):
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        cajas.append({
+            "indice": i,
+            "clase": scanner.nombre_clase(int(box.cls[0])),
+            "confianza": float(box.conf[0]),
+            "xyxy": (x1, y1, x2, y2),
+            "roi": (max(x1 - scanner.pad, 0), max(y1 - scanner.pad, 0),
+                    min(x2 + scanner.pad, w), min(y2 + scanner.pad, h))
+        })
+    print(f"📊 Detecciones con umbral {umbrales[0]}: {len(cajas)} (una sola inferencia)")
+
+    if not cajas:
         print("\n🖼️ Probando OCR en toda la imagen:")
-        try:
-            full_ocr = reader.readtext(image)
-            if full_ocr:
-                print(f"   ✅ Texto encontrado en imagen completa:")
-                for i, (bbox, text, conf) in enumerate(full_ocr):
-                    print(f"      {i+1}: '{text}' (confianza: {conf:.3f})")
-            else:
-                print("   ❌ No se detectó texto en toda la imagen")
-        except Exception as e:
-            print(f"   ❌ Error en OCR completo: {e}")
-    
+        full_ocr = scanner.leer_imagen(image)
+        if full_ocr:
+            print("   ✅ Texto encontrado en imagen completa:")
+            for i, (bbox, text, conf) in enumerate(full_ocr):
+                print(f"      {i+1}: '{text}' (confianza: {conf:.3f})")
+        else:
+            print("   ❌ No se detectó texto en toda la imagen")
+        print("\n" + "="*80)
+        print("🏁 DEBUG COMPLETADO")
+        print("="*80)
+        return {"cajas": [], "umbrales": {}}
+
+    # OCR de cada caja una sola vez, con el mismo recorte normalizado que usa el escáner y en una sola llamada
+    textos = scanner.leer_cajas(image, [c["roi"] for c in cajas], clases=[c["clase"] for c in cajas])
+    for caja, texto in zip(cajas, textos):
+        caja["texto"] = texto
+        if guardar_rois:
+            x1, y1, x2, y2 = caja["roi"]
+            roi = image[y1:y2, x1:x2]
+            cv2.imwrite(f"debug_roi_{caja['indice']+1}.jpg", roi)
+            lineas = separar_lineas(image, caja["roi"]) if caja["clase"] in CLASES_MULTILINEA else [caja["roi"]]
+            for n, linea in enumerate(lineas):
+                normalizado = normalizar_roi(image, linea)
+                if normalizado is not None:
+                    sufijo = f"_{n+1}" if len(lineas) > 1 else ""
+                    cv2.imwrite(f"debug_roi_normalizada_{caja['indice']+1}{sufijo}.jpg", normalizado)
+
+    print("\n📦 Cajas (ordenadas por confianza):")
+    for caja in sorted(cajas, key=lambda c: -c["confianza"]):
+        x1, y1, x2, y2 = caja["xyxy"]
+        visible = [u for u in umbrales if caja["confianza"] >= u]
+        print(f"\n📦 Caja {caja['indice']+1}: {caja['clase']}  confianza {caja['confianza']:.3f}  "
+              f"({x1}, {y1}) -> ({x2}, {y2})  {x2-x1}x{y2-y1}")
+        print(f"   🎚️ Visible hasta el umbral {max(visible) if visible else '-'}")
+        print(f"   🔤 OCR: '{caja['texto']}'" if caja["texto"] else "   🔤 OCR: ❌ No se detectó texto")
+        if guardar_rois:
+            print(f"   💾 ROI guardada: debug_roi_{caja['indice']+1}.jpg")
+
+    # Identificación en cada umbral con los textos ya leídos
+    print("\n🎯 Resultado por umbral de confianza:")
+    print(f"{'umbral':>7}{'cajas':>7}  {'clases':<45}identificación")
+    informe = {}
+    for umbral in umbrales:
+        activas = [c for c in cajas if c["confianza"] >= umbral]
+        cartas = identificar(scanner, activas)
+        clases = ", ".join(c["clase"] for c in activas) or "-"
+        resultado = ", ".join(f"{c['code']} {c['name']} ({c['score']:.2f})" for c in cartas[:3]) or "❌ sin coincidencias"
+        print(f"{umbral:>7.2f}{len(activas):>7}  {clases[:44]:<45}{resultado}")
+        informe[umbral] = {"cajas": [c["indice"] for c in activas], "cartas": cartas}
+
     print("\n" + "="*80)
     print("🏁 DEBUG COMPLETADO")
     print("="*80)
+    return {"cajas": [{k: v for k, v in c.items() if k != "roi"} for c in cajas], "umbrales": informe}
+
+def identificar(scanner, cajas):
+    """Cartas que saldrían de estas cajas con el mismo ranking conjunto que usa el escáner"""
+    cartas, _, _ = scanner.identificar([c for c in cajas if c["texto"]])
+    return cartas
 
 if __name__ == "__main__":
-    # Probar con la primera carta
-    debug_card_detection(
-        image_path="D:/trabajo/Escaner 2/cartas_prueba/OOF-02.png",  # Ajusta el path
-        weights_path="runs/detect/card_text_detection_precise/weights/best.pt",
-        json_path="D:/trabajo/Escaner 2/Cartas.Collection3.json"
-    )
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Análisis de detección y OCR de una carta con varios umbrales de confianza")
+    parser.add_argument('--image', default="cartas_prueba/OOF-02.png", help="Imagen de la carta")
+    parser.add_argument('--weights', default="runs/detect/card_text_detection_precise/weights/best.pt",
+                        help="Ruta al modelo entrenado")
+    parser.add_argument('--json', default="Cartas.Collection3.json", help="Ruta al archivo JSON de cartas")
+    parser.add_argument('--umbrales', type=float, nargs='+', default=UMBRALES, help="Umbrales de confianza a comparar")
+    parser.add_argument('--sin-rois', action='store_true', help="No guardar los recortes de cada caja")
+
+    args = parser.parse_args()
+
+    for path in (args.image, args.weights, args.json):
+        if not os.path.exists(path):
+            print(f"❌ Error: No existe: {path}")
+            sys.exit(1)
+
+    debug_card_detection(args.image, args.weights, args.json, umbrales=args.umbrales, guardar_rois=not args.sin_rois)
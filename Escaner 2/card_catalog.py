@@ -0,0 +1,261 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+
+from card_index import CorrectorOCR, IndiceCampos, IndiceKeywords, IndiceNombres
+
+# Cambiar este número invalida los artefactos ya compilados (p. ej. si cambia la clase Catalogo)
+ARTEFACTO_VERSION = 5
+
+CSV_FUENTES = ('cartas.csv', 'datos.csv', 'rarities.csv', 'url.csv')
+CAMPOS_CARTA = ('code', 'name', 'keywords', 'type', 'element', 'species', 'soul_cost', 'edge', 'shield')
+
+PATRON_CODIGO = re.compile(r'^\s*O[OF]F\s*[-_ ]?\s*(\d{1,3})\s*$', re.IGNORECASE)
+
+def clave_codigo(code):
+    """Clave canónica de un código de carta: 'OFF-5', 'oof 05' y 'OOF-05' -> 'OOF-05'"""
+    match = PATRON_CODIGO.match(str(code or ''))
+    if not match:
+        return None
+    return f"OOF-{int(match.group(1)):02d}"
+
+def _valor_csv(valor):
+    """Convierte los valores de los CSV exportados ('NULL', '', números) a tipos de Python"""
+    valor = (valor or '').strip()
+    if valor in ('', 'NULL', 'null', 'None'):
+        return None
+    try:
+        return int(valor)
+    except ValueError:
+        return valor
+
+def _leer_csv(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+class Catalogo:
+    """Catálogo de cartas ya fusionado con sus tablas de búsqueda precalculadas"""
+
+    def __init__(self, cartas, rarezas, firmas):
+        self.cartas = cartas
+        self.rarezas = rarezas
+        self.firmas = firmas
+        self.version = hashlib.sha1(repr(sorted(firmas.items())).encode('utf-8')).hexdigest()[:12]
+
+        self.por_codigo = {}
+        self.por_nombre = {}
+        for card_id, card in enumerate(cartas):
+            clave = clave_codigo(card.get('code'))
+            if clave:
+                self.por_codigo.setdefault(clave, card_id)
+            if card.get('name'):
+                self.por_nombre.setdefault(card['name'].lower(), card_id)
+
+        self.indice_nombres = IndiceNombres(cartas)
+        self.indice_keywords = IndiceKeywords(cartas)
+        self.corrector = CorrectorOCR(cartas)
+        self.indice_campos = IndiceCampos(cartas)
+
+    def buscar_codigo(self, code):
+        """Carta con ese código (acepta las variantes OOF/OFF) o None"""
+        card_id = self.por_codigo.get(clave_codigo(code))
+        return None if card_id is None else self.cartas[card_id]
+
+def fuentes_catalogo(json_path, csv_dir=None):
+    """Archivos fuente del catálogo: el JSON exportado de Mongo y los CSV que existan.
+
+    Si no se indica csv_dir, los CSV se buscan junto al JSON y en la carpeta superior.
+    """
+    fuentes = [json_path]
+    carpetas = [csv_dir] if csv_dir else [os.path.dirname(os.path.abspath(json_path)),
+                                          os.path.dirname(os.path.dirname(os.path.abspath(json_path)))]
+    for nombre in CSV_FUENTES:
+        for carpeta in carpetas:
+            path = os.path.join(carpeta, nombre)
+            if os.path.isfile(path):
+                fuentes.append(path)
+                break
+    return fuentes
+
+def firmas_fuentes(fuentes):
+    """(mtime, tamaño) de cada fuente para detectar cambios sin leer su contenido"""
+    firmas = {'__version__': ARTEFACTO_VERSION}
+    for path in fuentes:
+        st = os.stat(path)
+        firmas[os.path.abspath(path)] = (st.st_mtime_ns, st.st_size)
+    return firmas
+
+def compilar_catalogo(json_path, csv_dir=None):
+    """Fusiona el JSON de Mongo con cartas.csv, datos.csv, rarities.csv y url.csv.
+
+    El JSON manda; los CSV solo rellenan cartas o campos que falten. Se descartan
+    el _id de Mongo y las URLs de SharePoint, que no hacen falta para escanear.
+    """
+    fuentes = fuentes_catalogo(json_path, csv_dir)
+    por_clave = {}
+    cartas = []
+
+    def carta(code):
+        clave = clave_codigo(code) or str(code)
+        if clave not in por_clave:
+            por_clave[clave] = {'code': code}
+            cartas.append(por_clave[clave])
+        return por_clave[clave]
+
+    def rellenar(card, campo, valor):
+        if card.get(campo) in (None, '', []) and valor not in (None, '', []):
+            card[campo] = valor
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        for registro in json.load(f):
+            card = carta(registro.get('code'))
+            for campo in CAMPOS_CARTA:
+                if campo in registro:
+                    card[campo] = registro[campo]
+
+    rarezas = []
+    for path in fuentes[1:]:
+        nombre = os.path.basename(path)
+        filas = _leer_csv(path)
+        if nombre == 'cartas.csv':
+            for fila in filas:
+                card = carta(fila['codigo'])
+                rellenar(card, 'name', (fila.get('nombre') or '').strip())
+                rellenar(card, 'keywords', [kw.strip() for kw in (fila.get('palabras_clave') or '').split(',') if kw.strip()])
+                rellenar(card, 'type', (fila.get('tipo') or '').strip())
+                rellenar(card, 'element', (fila.get('elemento') or '').strip())
+                rellenar(card, 'species', (fila.get('especie') or '').strip())
+        elif nombre == 'datos.csv':
+            for fila in filas:
+                card = carta(fila['code'])
+                for campo in ('soul_cost', 'edge', 'shield'):
+                    rellenar(card, campo, _valor_csv(fila.get(campo)))
+        elif nombre == 'rarities.csv':
+            rarezas = [fila['rarity'].strip() for fila in filas if fila.get('rarity')]
+        elif nombre == 'url.csv':
+            # Solo se usa para conocer códigos que aún no están en los otros archivos
+            for fila in filas:
+                carta(fila['code'])
+
+    for card in cartas:
+        for campo in CAMPOS_CARTA:
+            card.setdefault(campo, [] if campo == 'keywords' else None)
+
+    return Catalogo(cartas, rarezas, firmas_fuentes(fuentes))
+
+def ruta_artefacto(json_path):
+    return os.path.splitext(json_path)[0] + '.catalogo.pkl'
+
+def cargar_catalogo(json_path, csv_dir=None, artefacto=None, forzar=False, log=print):
+    """Carga el catálogo compilado, recompilándolo si alguna fuente cambió desde la última vez"""
+    artefacto = artefacto or ruta_artefacto(json_path)
+    firmas = firmas_fuentes(fuentes_catalogo(json_path, csv_dir))
+
+    if not forzar and os.path.exists(artefacto):
+        try:
+            with open(artefacto, 'rb') as f:
+                catalogo = pickle.load(f)
+            if catalogo.firmas == firmas:
+                return catalogo
+        except Exception as e:
+            log(f"⚠️ Artefacto de catálogo inválido, recompilando: {e}")
+
+    catalogo = compilar_catalogo(json_path, csv_dir)
+    # Nombre por proceso: varios workers pueden recompilar a la vez
+    temporal = f"{artefacto}.{os.getpid()}.tmp"
+    with open(temporal, 'wb') as f:
+        pickle.dump(catalogo, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, artefacto)
+    log(f"📦 Catálogo compilado: {len(catalogo.cartas)} cartas -> {artefacto}")
+    return catalogo
+
+class VigilanteCatalogo:
+    """Hilo que vigila las fuentes del catálogo y lo recompila en segundo plano cuando cambian.
+
+    Cada `intervalo` segundos compara las firmas (mtime, tamaño) de las fuentes,
+    así que también detecta un CSV nuevo o una exportación nueva de Collection3.
+    Solo recompila cuando las firmas se repiten en dos comprobaciones seguidas,
+    para no leer un archivo a medio copiar, y entrega el catálogo nuevo a
+    `al_cambiar`. Si la recompilación falla se sigue con el catálogo anterior
+    hasta el siguiente cambio.
+    """
+
+    def __init__(self, json_path, al_cambiar, csv_dir=None, firmas=None, intervalo=2.0, log=print):
+        self.json_path = json_path
+        self.csv_dir = csv_dir
+        self.al_cambiar = al_cambiar
+        self.intervalo = intervalo
+        self.log = log
+        self.firmas = firmas if firmas is not None else firmas_fuentes(fuentes_catalogo(json_path, csv_dir))
+        self.pendientes = None
+        self.detener = threading.Event()
+        self.hilo = None
+
+    def revisar(self):
+        """Una comprobación; devuelve el catálogo nuevo si se recompiló"""
+        try:
+            firmas = firmas_fuentes(fuentes_catalogo(self.json_path, self.csv_dir))
+        except OSError:
+            return None  # una fuente se está sustituyendo en este momento
+        if firmas == self.firmas:
+            self.pendientes = None
+            return None
+        if firmas != self.pendientes:
+            self.pendientes = firmas
+            return None
+        self.pendientes = None
+        self.firmas = firmas
+        try:
+            catalogo = cargar_catalogo(self.json_path, self.csv_dir, log=self.log)
+        except Exception as e:
+            self.log(f"⚠️ No se pudo recompilar el catálogo, se mantiene el anterior: {e}")
+            return None
+        self.firmas = catalogo.firmas
+        self.al_cambiar(catalogo)
+        return catalogo
+
+    def _bucle(self):
+        while not self.detener.wait(self.intervalo):
+            self.revisar()
+
+    def iniciar(self):
+        self.detener.clear()
+        self.hilo = threading.Thread(target=self._bucle, name='vigilante-catalogo', daemon=True)
+        self.hilo.start()
+        return self
+
+    def parar(self):
+        self.detener.set()
+        if self.hilo is not None:
+            self.hilo.join()
+            self.hilo = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compila el catálogo de cartas en un artefacto binario")
+    parser.add_argument('--json', required=True, help="Ruta al archivo JSON de cartas")
+    parser.add_argument('--csv-dir', help="Carpeta con cartas.csv, datos.csv, rarities.csv y url.csv")
+    parser.add_argument('--output', help="Ruta del artefacto (por defecto junto al JSON)")
+    parser.add_argument('--forzar', action='store_true', help="Recompilar aunque no haya cambios")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.json):
+        print(f"❌ Error: El archivo JSON no existe: {args.json}")
+        sys.exit(1)
+
+    # Se importa el propio módulo para que el pickle referencie card_catalog.Catalogo y no __main__.Catalogo
+    import card_catalog
+
+    inicio = time.perf_counter()
+    catalogo = card_catalog.cargar_catalogo(args.json, args.csv_dir, args.output, forzar=args.forzar)
+    print(f"✅ {len(catalogo.cartas)} cartas, {len(catalogo.por_codigo)} códigos, "
+          f"{len(catalogo.indice_keywords.postings)} palabras clave, "
+          f"{len(catalogo.corrector.frecuencias)} palabras corregibles (versión {catalogo.version}) "
+          f"en {(time.perf_counter() - inicio) * 1000:.1f} ms")
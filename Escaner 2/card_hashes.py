@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from card_catalog import clave_codigo
+from card_layout import ALTO_CANONICO, ANCHO_CANONICO, contornos_carta, cuadrilatero, rectificar
+
+# 2: la carta se rectifica por su cuadrilátero antes del hash
+HASH_VERSION = 2
+
+# Código al principio del nombre: 'OOF-50.png' o 'OOF-50_0215.jpg' (imágenes del dataset)
+PREFIJO_CODIGO = re.compile(r'\s*(O[OF]F\s*[-_ ]?\s*\d{1,3})(?!\d)', re.IGNORECASE)
+
+def recortar_carta(image, area_min=0.2):
+    """Carta rectificada por su cuadrilátero; sin él, el recuadro del contorno más grande o la imagen entera"""
+    contornos, escala = contornos_carta(image, area_min)
+    esquinas = cuadrilatero(contornos, escala)
+    if esquinas is not None:
+        return rectificar(image, esquinas, ANCHO_CANONICO // 4, ALTO_CANONICO // 4)
+    if not contornos:
+        return image
+    x, y, cw, ch = cv2.boundingRect(contornos[0])
+    x1, y1 = int(x / escala), int(y / escala)
+    x2, y2 = int((x + cw) / escala), int((y + ch) / escala)
+    return image[y1:y2, x1:x2]
+
+def phash(image):
+    """Hash perceptual de 64 bits (DCT de la imagen en gris a 32x32, bloque 8x8 de baja frecuencia)"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    bajas = cv2.dct(small)[:8, :8].flatten()
+    # La mediana se calcula sin el término de continua, que solo refleja el brillo medio
+    bits = bajas > np.median(bajas[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+def codigo_archivo(path):
+    """Código de carta al principio del nombre del archivo, o None"""
+    match = PREFIJO_CODIGO.match(Path(path).stem)
+    return clave_codigo(match.group(1)) if match else None
+
+def calcular_hashes_referencia(carpeta):
+    """Hash de cada imagen de referencia de la carpeta y sus subcarpetas; el código sale del nombre del archivo"""
+    referencias = []
+    for path in sorted(Path(carpeta).rglob('*')):
+        if path.suffix.lower() not in ('.jpg', '.jpeg', '.png', '.bmp', '.webp'):
+            continue
+        code = codigo_archivo(path)
+        if code is None:
+            print(f"⚠️ Nombre sin código de carta, se omite: {path.name}")
+            continue
+        image = cv2.imread(str(path))
+        if image is None:
+            print(f"⚠️ No se pudo cargar {path.name}")
+            continue
+        referencias.append({"code": code, "hash": f"{phash(recortar_carta(image)):016x}"})
+        print(f"✅ {path.name} -> {code} {referencias[-1]['hash']}")
+    return referencias
+
+def guardar_hashes(referencias, output):
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({"version": HASH_VERSION, "tipo": "phash64", "referencias": referencias}, f, indent=2)
+
+class IndiceHashes:
+    """Hashes de referencia en un array uint64 para buscar el más cercano por distancia de Hamming"""
+
+    def __init__(self, path, max_distancia=10, margen=6):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != HASH_VERSION:
+            raise ValueError(f"Versión de hashes no soportada: {data.get('version')}")
+        self.codes = [r["code"] for r in data["referencias"]]
+        self.hashes = np.array([int(r["hash"], 16) for r in data["referencias"]], dtype=np.uint64)
+        self.max_distancia = max_distancia
+        self.margen = margen
+
+    def distancias(self, h):
+        xor = np.bitwise_xor(self.hashes, np.uint64(h))
+        return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+    def buscar(self, image):
+        """(code, distancia) de la referencia más cercana, o (None, distancia) si la coincidencia es ambigua.
+
+        Se acepta solo si la distancia es <= max_distancia y la mejor referencia
+        de otra carta está al menos `margen` bits más lejos.
+        """
+        if not len(self.hashes):
+            return None, None
+        dist = self.distancias(phash(recortar_carta(image)))
+        orden = np.argsort(dist, kind='stable')
+        mejor = orden[0]
+        code, distancia = self.codes[mejor], int(dist[mejor])
+        segunda = next((int(dist[i]) for i in orden[1:] if self.codes[i] != code), 64)
+        if distancia <= self.max_distancia and segunda - distancia >= self.margen:
+            return code, distancia
+        return None, distancia
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcula los hashes perceptuales de las cartas de referencia")
+    # cartas_prueba/ no: es la verdad de referencia de scan_benchmark.py
+    parser.add_argument('--referencias', default=os.path.join('dataset', 'images'),
+                        help="Carpeta con imágenes cuyo nombre empieza por el código (OOF-02.png, OOF-50_0215.jpg, ...)")
+    parser.add_argument('--output', default='hashes_referencia.json', help="Archivo JSON de salida")
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.referencias):
+        print(f"❌ Error: La carpeta no existe: {args.referencias}")
+        sys.exit(1)
+
+    referencias = calcular_hashes_referencia(args.referencias)
+    if not referencias:
+        print("❌ No se calculó ningún hash")
+        sys.exit(1)
+    guardar_hashes(referencias, args.output)
+    print(f"💾 {len(referencias)} hashes guardados en {args.output}")
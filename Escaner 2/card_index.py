@@ -0,0 +1,387 @@
+import re
+from collections import defaultdict, deque
+
+import numpy as np
+
+def limpiar_texto(texto):
+    """Limpia el texto removiendo caracteres especiales y normalizando espacios"""
+    texto = re.sub(r'[^\w\s]', ' ', texto)
+    texto = re.sub(r'\s+', ' ', texto)
+    return texto.strip().lower()
+
+def ngramas(texto, n=2):
+    """Conjunto de n-gramas de caracteres del texto (vacío si es más corto que n)"""
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+def codificar(palabra):
+    """Puntos de código de la palabra como array int32"""
+    return np.frombuffer(palabra.encode('utf-32-le'), dtype=np.uint32).astype(np.int32)
+
+class VocabularioVectorial:
+    """Palabras del catálogo en una matriz int32 para puntuarlas todas a la vez con 2·LCS / (len(a) + len(b))"""
+
+    def __init__(self, palabras):
+        self.palabras = list(palabras)
+        self.longitudes = np.array([len(p) for p in self.palabras], dtype=np.int32)
+        ancho = max(1, int(self.longitudes.max())) if len(self.palabras) else 1
+        # -1 no coincide con ningún carácter: el relleno no altera la LCS
+        self.matriz = np.full((len(self.palabras), ancho), -1, dtype=np.int32)
+        for i, palabra in enumerate(self.palabras):
+            if palabra:
+                self.matriz[i, :len(palabra)] = codificar(palabra)
+
+    def lcs(self, palabra, ids=None):
+        """Longitud de la subsecuencia común más larga con cada palabra (o solo con las filas `ids`)"""
+        matriz = self.matriz if ids is None else self.matriz[ids]
+        fila = np.zeros(matriz.shape, dtype=np.int32)
+        diagonal = np.zeros(matriz.shape, dtype=np.int32)
+        for c in codificar(palabra):
+            diagonal[:, 1:] = fila[:, :-1]
+            np.maximum(fila, diagonal + (matriz == c), out=fila)
+            np.maximum.accumulate(fila, axis=1, out=fila)
+        return fila[:, -1]
+
+    def similitudes(self, palabra, ids=None):
+        longitudes = self.longitudes if ids is None else self.longitudes[ids]
+        total = longitudes + len(palabra)
+        return np.divide(2.0 * self.lcs(palabra, ids), total, out=np.zeros(len(total)), where=total > 0)
+
+    def mejores(self, palabra, umbral, top_k=None):
+        """[(índice, similitud)] de las palabras con similitud >= umbral, de mayor a menor"""
+        sims = self.similitudes(palabra)
+        ids = np.flatnonzero(sims >= umbral)
+        ids = ids[np.argsort(-sims[ids], kind='stable')]
+        if top_k:
+            ids = ids[:top_k]
+        return [(int(i), float(sims[i])) for i in ids]
+
+class IndiceNombres:
+    """Índice invertido de n-gramas de caracteres sobre los nombres de las cartas"""
+
+    def __init__(self, cards, n=2):
+        self.n = n
+        self.nombres = [str(card.get("name") or "").lower() for card in cards]
+        self.gramas = [ngramas(nombre, n) for nombre in self.nombres]
+        self.vocabulario = VocabularioVectorial(self.nombres)
+        self.postings = defaultdict(set)
+        # Nombres demasiado cortos para tener n-gramas: se comprueban siempre
+        self.cortos = []
+        for card_id, grams in enumerate(self.gramas):
+            if not grams:
+                self.cortos.append(card_id)
+            for gram in grams:
+                self.postings[gram].add(card_id)
+        self.postings = dict(self.postings)
+
+    def coincidencia_exacta(self, texto):
+        """Primera carta (en orden de catálogo) cuyo nombre aparece literal en el texto"""
+        texto = texto.lower()
+        aciertos = defaultdict(int)
+        for gram in ngramas(texto, self.n):
+            for card_id in self.postings.get(gram, ()):
+                aciertos[card_id] += 1
+        # Un nombre contenido en el texto tiene todos sus n-gramas en el texto
+        candidatos = [card_id for card_id, n in aciertos.items() if n == len(self.gramas[card_id])]
+        for card_id in sorted(candidatos + self.cortos):
+            if self.nombres[card_id] and self.nombres[card_id] in texto:
+                return card_id
+        return None
+
+    def candidatos(self, palabra):
+        """Cartas cuyo nombre comparte al menos un n-grama con la palabra"""
+        ids = set()
+        for gram in ngramas(palabra, self.n):
+            ids.update(self.postings.get(gram, ()))
+        return ids
+
+    def buscar(self, texto, min_sim=0.6, top_k=None, estadisticas=None):
+        """Cartas por nombre: [(card_id, palabra, score, tipo)] con tipo 'exacta', 'parcial' o 'similitud'"""
+        card_id = self.coincidencia_exacta(texto)
+        if card_id is not None:
+            return [(card_id, self.nombres[card_id], 1.0, 'exacta')]
+
+        mejores = {}
+        for palabra in {p.strip() for p in limpiar_texto(texto).split()}:
+            if len(palabra) < 3:  # Ignorar palabras muy cortas
+                continue
+            candidatos = sorted(self.candidatos(palabra))
+            if estadisticas is not None:
+                estadisticas['candidatos'] = estadisticas.get('candidatos', 0) + len(candidatos)
+            if not candidatos:
+                continue
+            similitudes = self.vocabulario.similitudes(palabra, np.array(candidatos))
+            for card_id, ratio in zip(candidatos, similitudes.tolist()):
+                name = self.nombres[card_id]
+                score, tipo = 0.0, None
+                if palabra in name and len(palabra) / len(name) > 0.5:
+                    score, tipo = len(palabra) / len(name), 'parcial'
+                if ratio >= min_sim and ratio > score:
+                    score, tipo = ratio, 'similitud'
+
+                if tipo and score > mejores.get(card_id, (None, 0.0))[1]:
+                    mejores[card_id] = (palabra, score, tipo)
+
+        ranking = sorted(
+            ((card_id, palabra, score, tipo) for card_id, (palabra, score, tipo) in mejores.items()),
+            key=lambda r: (-r[2], r[0])
+        )
+        return ranking[:top_k] if top_k else ranking
+
+def borrados(palabra, distancia):
+    """La palabra y todas las cadenas que resultan de quitarle hasta `distancia` caracteres"""
+    resultado = {palabra}
+    frontera = {palabra}
+    for _ in range(distancia):
+        frontera = {p[:i] + p[i + 1:] for p in frontera for i in range(len(p))}
+        resultado |= frontera
+    return resultado
+
+def distancia_edicion(a, b):
+    """Distancia de Damerau-Levenshtein restringida (inserción, borrado, sustitución y trasposición)"""
+    anterior2, anterior = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                actual[j] = min(actual[j], anterior2[j - 2] + 1)
+        anterior2, anterior = anterior, actual
+    return anterior[-1]
+
+class CorrectorOCR:
+    """Diccionario de borrados al estilo SymSpell sobre las palabras del catálogo"""
+
+    CAMPOS = ('name', 'species', 'element', 'keywords')
+
+    def __init__(self, cards, distancia_maxima=2):
+        self.distancia_maxima = distancia_maxima
+        frecuencias = defaultdict(int)
+        for card in cards:
+            for campo in self.CAMPOS:
+                valores = card.get(campo)
+                for valor in valores if isinstance(valores, list) else [valores]:
+                    for palabra in limpiar_texto(str(valor or '')).split():
+                        frecuencias[palabra] += 1
+        self.frecuencias = dict(frecuencias)
+
+        self.borrados = defaultdict(list)
+        for palabra in sorted(self.frecuencias):
+            for borrado in borrados(palabra, distancia_maxima):
+                self.borrados[borrado].append(palabra)
+        self.borrados = dict(self.borrados)
+
+    def distancia_permitida(self, palabra):
+        """Errores admitidos según la longitud: las palabras cortas se dejan como están"""
+        if len(palabra) <= 3:
+            return 0
+        return min(self.distancia_maxima, 1 if len(palabra) <= 6 else 2)
+
+    def corregir_palabra(self, palabra):
+        """Palabra del vocabulario más cercana al token, o el propio token si no hay ninguna"""
+        if palabra in self.frecuencias:
+            return palabra
+        distancia = self.distancia_permitida(palabra)
+        if not distancia:
+            return palabra
+        candidatos = set()
+        for borrado in borrados(palabra, distancia):
+            candidatos.update(self.borrados.get(borrado, ()))
+        mejor = None
+        for candidato in candidatos:
+            d = distancia_edicion(palabra, candidato)
+            if d <= distancia:
+                clave = (d, -self.frecuencias[candidato], candidato)
+                if mejor is None or clave < mejor:
+                    mejor = clave
+        return palabra if mejor is None else mejor[2]
+
+    def corregir(self, texto):
+        """Texto con cada palabra corregida (el resto intacto) y la lista de correcciones [(token, palabra)]"""
+        correcciones = []
+
+        def sustituir(match):
+            token = match.group(0).lower()
+            palabra = self.corregir_palabra(token)
+            if palabra == token:
+                return match.group(0)
+            correcciones.append((token, palabra))
+            return palabra
+
+        return re.sub(r'\w+', sustituir, texto), correcciones
+
+class AutomataKeywords:
+    """Autómata de Aho-Corasick que encuentra todas las palabras clave en una sola pasada por el texto"""
+
+    def __init__(self, palabras):
+        """`palabras`: {texto a buscar: keyword que se devuelve al encontrarlo}"""
+        self.transiciones = [{}]
+        self.fallo = [0]
+        self.salida = [[]]
+        for texto, keyword in palabras.items():
+            estado = 0
+            for c in texto:
+                siguiente = self.transiciones[estado].get(c)
+                if siguiente is None:
+                    siguiente = len(self.transiciones)
+                    self.transiciones[estado][c] = siguiente
+                    self.transiciones.append({})
+                    self.fallo.append(0)
+                    self.salida.append([])
+                estado = siguiente
+            self.salida[estado].append((len(texto), keyword))
+
+        # Enlaces de fallo por anchura: el sufijo más largo que también es prefijo de alguna palabra
+        cola = deque(self.transiciones[0].values())
+        while cola:
+            estado = cola.popleft()
+            for c, siguiente in self.transiciones[estado].items():
+                cola.append(siguiente)
+                fallo = self.fallo[estado]
+                while fallo and c not in self.transiciones[fallo]:
+                    fallo = self.fallo[fallo]
+                self.fallo[siguiente] = self.transiciones[fallo].get(c, 0)
+                self.salida[siguiente] = self.salida[siguiente] + self.salida[self.fallo[siguiente]]
+
+    def buscar(self, texto):
+        """[(inicio, fin, keyword)] de todas las apariciones, también solapadas"""
+        encontradas = []
+        estado = 0
+        for i, c in enumerate(texto):
+            while estado and c not in self.transiciones[estado]:
+                estado = self.fallo[estado]
+            estado = self.transiciones[estado].get(c, 0)
+            for longitud, keyword in self.salida[estado]:
+                encontradas.append((i + 1 - longitud, i + 1, keyword))
+        return encontradas
+
+class IndiceKeywords:
+    """Índice invertido palabra clave -> cartas, con las erratas del catálogo unidas a su keyword"""
+
+    def __init__(self, cards):
+        self.postings = defaultdict(set)
+        for card_id, card in enumerate(cards):
+            for kw in card.get("keywords", []) or []:
+                kw = str(kw).strip().lower()
+                if kw:
+                    self.postings[kw].add(card_id)
+
+        # Erratas del catálogo: se asocian a la grafía más frecuente a una edición
+        por_frecuencia = sorted(self.postings, key=lambda kw: (-len(self.postings[kw]), kw))
+        self.alias = {}
+        for i, kw in enumerate(por_frecuencia):
+            if len(kw) < 5:
+                continue
+            for canonica in por_frecuencia[:i]:
+                if canonica not in self.alias and distancia_edicion(kw, canonica) <= 1:
+                    self.alias[kw] = canonica
+                    break
+        for variante, canonica in self.alias.items():
+            self.postings[canonica] |= self.postings.pop(variante)
+        self.postings = dict(self.postings)
+
+        self.palabras = sorted(set(self.postings) | set(self.alias))
+        self.automata = AutomataKeywords({kw: self.canonica(kw) for kw in self.palabras})
+        self.vocabulario = VocabularioVectorial(self.palabras)
+
+    def canonica(self, keyword):
+        keyword = str(keyword).lower()
+        return self.alias.get(keyword, keyword)
+
+    def encontrar(self, texto, similarity_threshold=0.75, log=print, estadisticas=None):
+        """Keywords canónicas presentes en el texto, en orden de aparición"""
+        texto = limpiar_texto(texto)
+        encontradas = []
+        cubierto = [False] * len(texto)
+        for inicio, fin, keyword in self.automata.buscar(texto):
+            # Solo palabras completas: 'push' no debe salir de 'pushover'
+            if (inicio == 0 or texto[inicio - 1] == ' ') and (fin == len(texto) or texto[fin] == ' '):
+                cubierto[inicio:fin] = [True] * (fin - inicio)
+                if keyword not in encontradas:
+                    encontradas.append(keyword)
+
+        inicio = 0
+        for palabra in texto.split(' '):
+            pendiente = len(palabra) > 3 and not cubierto[inicio]
+            inicio += len(palabra) + 1
+            if not pendiente:
+                continue
+            if estadisticas is not None:
+                estadisticas['candidatos'] = estadisticas.get('candidatos', 0) + len(self.palabras)
+            for i, ratio in self.vocabulario.mejores(palabra, similarity_threshold, top_k=1):
+                keyword = self.canonica(self.palabras[i])
+                log(f"🔑 Palabra clave similar: '{palabra}' ≈ '{keyword}' ({ratio:.2f})")
+                if keyword not in encontradas:
+                    encontradas.append(keyword)
+        return encontradas
+
+    def buscar(self, keywords, modo='union', top_k=None):
+        """[(card_id, nº de keywords compartidas)] de más a menos; modo='todas' exige todas"""
+        canonicas = {self.canonica(kw) for kw in keywords}
+        listas = [self.postings.get(kw, set()) for kw in canonicas]
+        if not listas:
+            return []
+        if modo == 'todas':
+            ids = set.intersection(*listas)
+        else:
+            ids = set().union(*listas)
+
+        ranking = sorted(
+            ((card_id, sum(card_id in lista for lista in listas)) for card_id in ids),
+            key=lambda r: (-r[1], r[0])
+        )
+        return ranking[:top_k] if top_k else ranking
+
+class IndiceCampos:
+    """Tablas valor -> cartas de los campos cortos (tipo, elemento, especie) y de las estadísticas"""
+
+    CAMPOS = ('type', 'element', 'species')
+    ESTADISTICAS = ('soul_cost', 'edge', 'shield')
+
+    def __init__(self, cards):
+        self.postings = {campo: defaultdict(set) for campo in self.CAMPOS}
+        self.numeros = defaultdict(set)
+        self.estadisticas = []
+        for card_id, card in enumerate(cards):
+            for campo in self.CAMPOS:
+                valor = str(card.get(campo) or '')
+                # 'moth / familiar' se indexa entero y por partes
+                for parte in {valor, *valor.split('/')}:
+                    parte = limpiar_texto(parte)
+                    if parte:
+                        self.postings[campo][parte].add(card_id)
+            valores = [int(card[c]) for c in self.ESTADISTICAS if isinstance(card.get(c), (int, float))]
+            self.estadisticas.append(valores)
+            for valor in valores:
+                self.numeros[valor].add(card_id)
+        self.postings = {campo: dict(postings) for campo, postings in self.postings.items()}
+        self.numeros = dict(self.numeros)
+
+    def buscar(self, campo, texto):
+        """{card_id: 1.0} de las cartas cuyo valor del campo aparece como palabra(s) en el texto, y esos valores"""
+        texto = f" {limpiar_texto(texto)} "
+        scores = {}
+        valores = []
+        for valor, ids in self.postings[campo].items():
+            if f" {valor} " in texto:
+                valores.append(valor)
+                scores.update(dict.fromkeys(ids, 1.0))
+        return scores, valores
+
+    def buscar_estadisticas(self, numeros):
+        """{card_id: fracción de sus estadísticas presentes entre los números leídos}"""
+        leidos = defaultdict(int)
+        for numero in numeros:
+            leidos[int(numero)] += 1
+        candidatos = set()
+        for numero in leidos:
+            candidatos.update(self.numeros.get(numero, ()))
+        scores = {}
+        for card_id in candidatos:
+            pendientes = dict(leidos)
+            aciertos = 0
+            for valor in self.estadisticas[card_id]:
+                if pendientes.get(valor):
+                    pendientes[valor] -= 1
+                    aciertos += 1
+            scores[card_id] = aciertos / max(len(self.estadisticas[card_id]), sum(leidos.values()))
+        return scores
@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+
+# Cajas relativas (x, y, ancho, alto) de cada campo de texto en las cartas OOF.
+# Son las que usa yolo_card_trainer.py para anotar el dataset.
+LAYOUT = {
+    'card_name':     (0.10, 0.03, 0.80, 0.05),
+    'element_type':  (0.08, 0.72, 0.84, 0.035),
+    'species':       (0.08, 0.76, 0.45, 0.03),
+    'description':   (0.08, 0.81, 0.84, 0.10),
+    'stats':         (0.65, 0.91, 0.30, 0.05),
+    'card_code':     (0.80, 0.97, 0.18, 0.02)
+}
+
+# Franjas para leer directamente sin YOLO, medidas sobre las cartas de cartas_prueba:
+# más ajustadas al texto que las cajas de entrenamiento, que van algo desplazadas hacia abajo.
+CAMPOS_LECTURA = {
+    'card_name':     (0.08, 0.005, 0.84, 0.05),
+    'card_code':     (0.78, 0.948, 0.21, 0.027)
+}
+
+# Tamaño de los escaneos de referencia (proporción de una carta de 63x88 mm)
+ANCHO_CANONICO, ALTO_CANONICO = 1314, 1836
+PROPORCION_CARTA = ANCHO_CANONICO / ALTO_CANONICO
+
+def caja_absoluta(relativa, w, h):
+    """Caja relativa (x, y, ancho, alto) a píxeles (x1, y1, x2, y2) en una imagen de w x h"""
+    x, y, bw, bh = relativa
+    return int(x * w), int(y * h), int(min(x + bw, 1) * w), int(min(y + bh, 1) * h)
+
+def ordenar_esquinas(puntos):
+    """Ordena 4 puntos como arriba-izquierda, arriba-derecha, abajo-derecha, abajo-izquierda"""
+    puntos = np.asarray(puntos, dtype=np.float32).reshape(4, 2)
+    suma = puntos.sum(axis=1)
+    resta = np.diff(puntos, axis=1).ravel()
+    return np.array([
+        puntos[np.argmin(suma)],
+        puntos[np.argmin(resta)],
+        puntos[np.argmax(suma)],
+        puntos[np.argmax(resta)]
+    ], dtype=np.float32)
+
+def proporcion(esquinas):
+    """Lado corto / lado largo medios de un cuadrilátero ordenado"""
+    tl, tr, br, bl = esquinas
+    ancho = (np.linalg.norm(tr - tl) + np.linalg.norm(br - bl)) / 2
+    alto = (np.linalg.norm(bl - tl) + np.linalg.norm(br - tr)) / 2
+    return min(ancho, alto) / max(ancho, alto, 1e-6)
+
+def contornos_carta(image, area_min=0.2, lado=500):
+    """(contornos externos de más de `area_min` de la imagen de mayor a menor, escala) sobre una copia de `lado` px"""
+    h, w = image.shape[:2]
+    escala = lado / max(h, w)
+    small = cv2.resize(image, (max(1, int(w * escala)), max(1, int(h * escala))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contornos, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    area_total = small.shape[0] * small.shape[1]
+    grandes = [c for c in sorted(contornos, key=cv2.contourArea, reverse=True) if cv2.contourArea(c) >= area_min * area_total]
+    return grandes, escala
+
+def cuadrilatero(contornos, escala, tolerancia_proporcion=0.15):
+    """Esquinas del primer contorno de 4 lados con proporción de carta, o None"""
+    for contorno in contornos:
+        aprox = cv2.approxPolyDP(contorno, 0.02 * cv2.arcLength(contorno, True), True)
+        if len(aprox) == 4 and cv2.isContourConvex(aprox):
+            esquinas = ordenar_esquinas(aprox / escala)
+            if abs(proporcion(esquinas) - PROPORCION_CARTA) <= tolerancia_proporcion:
+                return esquinas
+    return None
+
+def encontrar_cuadrilatero(image, area_min=0.2, tolerancia_proporcion=0.15):
+    """Esquinas de la carta en la imagen, o None si no hay un contorno de 4 lados con forma de carta.
+
+    Se exige que la proporción de lados se parezca a la de la carta para no
+    confundirla con recuadros interiores (la caja de descripción, por ejemplo).
+    Un escaneo plano ya recortado a la carta no tiene borde que encontrar: en ese
+    caso el llamador usa las esquinas de la imagen completa.
+    """
+    return cuadrilatero(*contornos_carta(image, area_min), tolerancia_proporcion)
+
+def esquinas_imagen(image):
+    h, w = image.shape[:2]
+    return np.array([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]], dtype=np.float32)
+
+def homografia(esquinas, ancho=ANCHO_CANONICO, alto=ALTO_CANONICO):
+    """Homografía de la imagen a la carta canónica de ancho x alto"""
+    destino = np.array([[0, 0], [ancho - 1, 0], [ancho - 1, alto - 1], [0, alto - 1]], dtype=np.float32)
+    return cv2.getPerspectiveTransform(ordenar_esquinas(esquinas), destino)
+
+def rectificar(image, esquinas, ancho=ANCHO_CANONICO, alto=ALTO_CANONICO):
+    """Carta entera proyectada a ancho x alto desde sus esquinas"""
+    return cv2.warpPerspective(image, homografia(esquinas, ancho, alto), (ancho, alto), flags=cv2.INTER_LINEAR)
+
+def recortar_campos(image, H, campos=CAMPOS_LECTURA, ancho=ANCHO_CANONICO, alto=ALTO_CANONICO):
+    """Recorta cada campo de la carta rectificada sin rectificar la carta entera.
+
+    Para cada franja se compone la homografía con una traslación a su origen y
+    se proyecta solo esa franja, así el coste es el de los píxeles de texto y no
+    el de la carta completa a resolución canónica.
+    Devuelve {campo: (recorte, (x1, y1, x2, y2) en coordenadas canónicas)}.
+    """
+    recortes = {}
+    for campo, relativa in campos.items():
+        x1, y1, x2, y2 = caja_absoluta(relativa, ancho, alto)
+        traslacion = np.array([[1, 0, -x1], [0, 1, -y1], [0, 0, 1]], dtype=np.float64)
+        recorte = cv2.warpPerspective(image, traslacion @ H, (x2 - x1, y2 - y1), flags=cv2.INTER_LINEAR)
+        recortes[campo] = (recorte, (x1, y1, x2, y2))
+    return recortes
@@ -0,0 +1,126 @@
+import math
+import re
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# Log-verosimilitud que aporta a una carta una coincidencia perfecta en cada campo
+PESOS_CAMPOS = {
+    'codigo': 10.0,
+    'nombre': 7.0,
+    'keywords': 3.0,
+    'especie': 2.0,
+    'elemento': 1.5,
+    'tipo': 1.0,
+    'stats': 1.0
+}
+
+# Puntuación de la hipótesis "ninguna de las candidatas": fija, para que la confianza no
+# dependa del tamaño del catálogo (un nombre exacto solo da ~0.98, uno al 60 % ~0.77)
+PUNTUACION_NINGUNA = 3.0
+
+# Campos que se leen de cada clase de caja del detector
+CAMPOS_POR_CLASE = {
+    'card_code': ('codigo',),
+    'card_name': ('nombre',),
+    'element_type': ('elemento', 'tipo'),
+    'species': ('especie',),
+    'stats': ('stats',),
+    'description': ('keywords',),
+    'imagen_completa': tuple(PESOS_CAMPOS)
+}
+# Clases desconocidas (modelos antiguos): como antes, nombre y palabras clave
+CAMPOS_POR_DEFECTO = ('nombre', 'keywords')
+
+CAMPOS_CATALOGO = {'tipo': 'type', 'elemento': 'element', 'especie': 'species'}
+
+def campos_de(clase):
+    return CAMPOS_POR_CLASE.get(clase, CAMPOS_POR_DEFECTO)
+
+class ResolutorCartas:
+    """Ranking de cartas con la evidencia de todos los campos leídos a la vez"""
+
+    def __init__(self, catalogo, leer_codigo, pesos=PESOS_CAMPOS, similarity_threshold=0.75, log=print):
+        self.catalogo = catalogo
+        self.leer_codigo = leer_codigo
+        self.similarity_threshold = similarity_threshold
+        self.pesos = pesos
+        self.log = log
+
+    def puntuar(self, campo, texto, estadisticas=None, catalogo=None, clase=None):
+        """({card_id: score}, palabras que coincidieron) de un campo leído"""
+        catalogo = catalogo or self.catalogo
+        if campo == 'codigo':
+            # Fuera de una caja card_code solo cuenta un código con su forma completa
+            code = self.leer_codigo(texto, estricto=clase != 'card_code')
+            card_id = catalogo.por_codigo.get(code) if code else None
+            return ({card_id: 1.0}, [code]) if card_id is not None else ({}, [])
+
+        if campo == 'nombre':
+            indice = catalogo.indice_nombres
+            ranking = indice.buscar(texto, min_sim=0.6, estadisticas=estadisticas)
+            if not ranking:
+                return {}, []
+            # Además de la mejor palabra, el texto entero frente al nombre entero:
+            # 'hefest the flameborn' se parece más a 'hefest, the flameborn' que a 'the priest'
+            ids = np.array([card_id for card_id, _, _, _ in ranking])
+            completos = indice.vocabulario.similitudes(" ".join(texto.lower().split()), ids)
+            scores = {card_id: max(score, float(c)) for (card_id, _, score, _), c in zip(ranking, completos)}
+            return scores, sorted({palabra for _, palabra, _, _ in ranking})
+
+        if campo == 'keywords':
+            encontradas = catalogo.indice_keywords.encontrar(texto, self.similarity_threshold, log=self.log,
+                                                             estadisticas=estadisticas)
+            if not encontradas:
+                return {}, []
+            distintas = len({kw.lower() for kw in encontradas})
+            ranking = catalogo.indice_keywords.buscar(encontradas)
+            return {card_id: compartidas / distintas for card_id, compartidas in ranking}, encontradas
+
+        if campo == 'stats':
+            numeros = re.findall(r'\d+', texto)
+            scores = catalogo.indice_campos.buscar_estadisticas(numeros) if numeros else {}
+            return scores, numeros if scores else []
+
+        return catalogo.indice_campos.buscar(CAMPOS_CATALOGO[campo], texto)
+
+    def resolver(self, lecturas, top_k=5, presupuesto_ms=None, estadisticas=None, catalogo=None):
+        """Combina las lecturas [{"clase", "texto", "indice"}] en {"cartas", "evidencias", "completo"}"""
+        inicio = time.perf_counter()
+        catalogo = catalogo or self.catalogo
+        pendientes = sorted(
+            ((campo, lectura) for lectura in lecturas if lectura.get("texto") for campo in campos_de(lectura["clase"])),
+            key=lambda p: -self.pesos[p[0]]
+        )
+        total = defaultdict(float)
+        evidencias = []
+        corregidos = {}
+        completo = True
+        for campo, lectura in pendientes:
+            if presupuesto_ms is not None and (time.perf_counter() - inicio) * 1000 > presupuesto_ms:
+                self.log(f"⏳ Presupuesto de búsqueda agotado ({presupuesto_ms} ms): se omiten campos de menos peso")
+                completo = False
+                break
+            texto = lectura["texto"]
+            if campo != 'codigo':
+                # Cada texto se corrige una vez aunque alimente varios campos
+                if id(lectura) not in corregidos:
+                    corregidos[id(lectura)], correcciones = catalogo.corrector.corregir(texto)
+                    if correcciones:
+                        self.log(f"✏️ Corrección OCR: {', '.join(f'{a} -> {b}' for a, b in correcciones)}")
+                texto = corregidos[id(lectura)]
+            scores, palabras = self.puntuar(campo, texto, estadisticas, catalogo, lectura["clase"])
+            if not scores:
+                continue
+            for card_id, score in scores.items():
+                total[card_id] += self.pesos[campo] * score
+            evidencias.append({"campo": campo, "lectura": lectura, "palabras": palabras, "scores": scores})
+
+        ranking = sorted(total.items(), key=lambda r: (-r[1], r[0]))
+        if not ranking:
+            return {"cartas": [], "evidencias": evidencias, "completo": completo}
+        maximo = max(ranking[0][1], PUNTUACION_NINGUNA)
+        normalizador = sum(math.exp(z - maximo) for _, z in ranking) + math.exp(PUNTUACION_NINGUNA - maximo)
+        cartas = [(card_id, math.exp(z - maximo) / normalizador) for card_id, z in ranking[:top_k]]
+        return {"cartas": cartas, "evidencias": evidencias, "completo": completo}
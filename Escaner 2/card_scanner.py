@@ -2,199 +2,774 @@ import json
 import sys
 import os
 import argparse
-from ultralytics import YOLO
-import cv2
-import easyocr
-import difflib
+import glob
+import functools
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
 import re
 
-def load_json_cards(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+# ultralytics, easyocr y cv2 se importan al usarse: cuestan segundos y --help o un error
+# de argumentos no deberían pagarlos
+from card_catalog import VigilanteCatalogo, cargar_catalogo, clave_codigo
+from scan_cache import CacheResultados, huella_archivo
+from scan_metrics import Cronometro, Metricas
+from card_resolver import ResolutorCartas
 
-def limpiar_texto(texto):
-    """Limpia el texto removiendo caracteres especiales y normalizando espacios"""
-    texto = re.sub(r'[^\w\s]', ' ', texto)
-    texto = re.sub(r'\s+', ' ', texto)
-    return texto.strip().lower()
+# Clases con las que se entrenó el detector (YOLOCardTextTrainer.create_text_class_mapping)
+CLASES_TEXTO = {
+    0: 'card_name',
+    1: 'element_type',
+    2: 'species',
+    3: 'description',
+    4: 'stats',
+    5: 'card_code'
+}
+# Cajas que se leen siempre; el resto solo si con estas no se identificó la carta
+CLASES_PRIORITARIAS = ('card_code', 'card_name')
+# Cajas de varias líneas: se separan en líneas antes de escalarlas a ALTO_OCR
+CLASES_MULTILINEA = ('description',)
+# Confianza a partir de la cual la carta se da por identificada sin leer más cajas
+CONFIANZA_SUFICIENTE = 0.8
+# Tiempo máximo para combinar los campos leídos (los de menos peso se omiten si se agota)
+PRESUPUESTO_MATCH_MS = 50
 
-def buscar_cartas_por_keywords(text, cards, keywords_ref, similarity_threshold=0.75):
-    """Busca cartas por palabras clave con tolerancia a errores"""
-    texto = text.lower()
-    palabras_encontradas = []
-    
-    # Dividir el texto en palabras para búsqueda más precisa
-    palabras_texto = [p.strip() for p in limpiar_texto(texto).split()]
-    
-    # Buscar palabras clave en el texto usando similitud
-    for keyword in keywords_ref:
-        keyword_lower = keyword.lower()
-        # Buscar coincidencia directa
-        if keyword_lower in texto:
-            palabras_encontradas.append(keyword)
+# Confusiones típicas del OCR dentro de la parte numérica del código
+_OCR_DIGITOS = str.maketrans({'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', '|': '1', 'S': '5', 'B': '8', 'Z': '2', 'G': '6'})
+# Código aislado (sin letras ni dígitos pegados): 'OFFSET' u 'OFFLINE' no son códigos
+_PATRON_CODIGO_OCR = re.compile(r'(?<![A-Z0-9])([O0Q][O0QF]F)\s*[-_.~=]?\s*([0-9OQDILSBZG|]{1,3})(?![A-Z0-9])')
+# En texto libre además hace falta el guion y dos o tres cifras: 'push off 2 cards' no es OOF-02
+_PATRON_CODIGO_ESTRICTO = re.compile(r'(?<![A-Z0-9])([O0Q][O0QF]F)\s*[-_.~=]\s*([0-9OQDILSBZG|]{2,3})(?![A-Z0-9])')
+
+def leer_codigo(texto, estricto=False):
+    """Código OOF-NN normalizado del texto OCR, o None (con estricto=True solo la forma con guion)"""
+    patron = _PATRON_CODIGO_ESTRICTO if estricto else _PATRON_CODIGO_OCR
+    for match in patron.finditer(str(texto).upper()):
+        if not any(c.isdigit() for c in match.group(2)):
             continue
-            
-        # Buscar similitud entre palabras
-        for palabra in palabras_texto:
-            if len(palabra) > 3:  # Solo palabras significativas
-                ratio = difflib.SequenceMatcher(None, palabra, keyword_lower).ratio()
-                if ratio >= similarity_threshold:
-                    print(f"🔑 Palabra clave similar: '{palabra}' ≈ '{keyword}' ({ratio:.2f})")
-                    palabras_encontradas.append(keyword)
-                    break
-    
-    cartas_encontradas = []
-    for card in cards:
-        card_keywords = [str(kw).lower() for kw in card.get("keywords", [])]
-        if any(kw in card_keywords for kw in palabras_encontradas):
-            cartas_encontradas.append(card)
-            
-    return cartas_encontradas, palabras_encontradas
-
-def buscar_cartas_por_nombre_similar(text, cards, min_sim=0.6):
-    """Busca cartas por nombre con mayor tolerancia a errores"""
-    # Separar el texto en palabras, eliminando signos y espacios extra
-    palabras = [p.strip() for p in limpiar_texto(text).split()]
-    nombres_encontrados = []
-    palabras_encontradas = []
-    
-    # Búsqueda exacta primero
-    for card in cards:
-        name = card.get("name", "").lower()
-        if name in text.lower():
-            nombres_encontrados.append(card)
-            palabras_encontradas.append(name)
-            print(f"🎯 Coincidencia exacta: '{name}'")
-            return nombres_encontrados, palabras_encontradas
-    
-    # Búsqueda por similitud de palabra
-    for card in cards:
-        name = card.get("name", "").lower()
-        
-        # Comprobar cada palabra individual
-        for palabra in palabras:
-            if len(palabra) >= 3:  # Ignorar palabras muy cortas
-                # Comprobar si la palabra es parte del nombre de la carta
-                if palabra in name:
-                    ratio = len(palabra) / len(name)
-                    if ratio > 0.5:  # La palabra debe ser una parte significativa
-                        nombres_encontrados.append(card)
-                        palabras_encontradas.append(palabra)
-                        print(f"🔎 Coincidencia parcial: '{palabra}' en '{name}' (proporción: {ratio:.2f})")
-                        break
-                
-                # Comprobar similitud        
-                ratio = difflib.SequenceMatcher(None, palabra, name).ratio()
-                if ratio >= min_sim:
-                    nombres_encontrados.append(card)
-                    palabras_encontradas.append(palabra)
-                    print(f"🔍 Coincidencia por similitud: '{palabra}' ≈ '{name}' (similitud: {ratio:.2f})")
-                    break
-    
-    return nombres_encontrados, palabras_encontradas
+        digitos = match.group(2).translate(_OCR_DIGITOS)
+        if digitos.isdigit():
+            return clave_codigo(f"OOF-{digitos}")
+    return None
 
-def scan_card(image_path, weights_path, json_path):
-    model = YOLO(weights_path)
-    results = model(image_path, conf=0.1)[0]
-    print(f"📊 Detecciones encontradas: {len(results.boxes) if results.boxes is not None else 0}")
-
-    image = cv2.imread(image_path)
-    cards = load_json_cards(json_path)
-    keywords_ref = [
-        "recruit", "return", "push", "recharge", "recover", "vanquish", "ghost", "manifest", 
-        "silence", "break", "reveal", "sacrifice", "clone", "morph", "chosen one", "wanderer", 
-        "control", "flood", "approach", "unbreakable", "immune", "breakthrough", "assault", "undying"
-    ]
-    reader = easyocr.Reader(['en'])
-    detections = []
-    
-    if results.boxes is not None and len(results.boxes) > 0:
-        for i, box in enumerate(results.boxes):
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            confidence = float(box.conf[0])
-            print(f"🔍 Procesando caja {i+1}: confianza={confidence:.2f}, coordenadas=({x1},{y1},{x2},{y2})")
-            h, w = image.shape[:2]
-            pad = 10
-            x1p = max(x1 - pad, 0)
-            y1p = max(y1 - pad, 0)
-            x2p = min(x2 + pad, w)
-            y2p = min(y2 + pad, h)
-            roi = image[y1p:y2p, x1p:x2p]
-            result = reader.readtext(roi)
-            if result:
-                text = result[0][1]
-                print(f"📝 Texto detectado en caja {i+1}: {text.strip()}")
+# Altura de entrada del reconocedor de easyocr: cada caja se escala a ella antes de pasarla
+ALTO_OCR = 64
+# Lado mayor de la imagen completa cuando YOLO no encuentra cajas (CRAFT escala con los píxeles)
+LADO_MAX_COMPLETA = 1280
+SEPARACION_MOSAICO = 8
+
+def normalizar_roi(image, roi, alto=ALTO_OCR):
+    """Recorta la caja, la escala a `alto` píxeles y devuelve el recorte en gris con el contraste estirado"""
+    import cv2
+    x1, y1, x2, y2 = roi
+    recorte = image[y1:y2, x1:x2]
+    h, w = recorte.shape[:2]
+    if h == 0 or w == 0:
+        return None
+    escala = alto / h
+    interpolacion = cv2.INTER_AREA if escala < 1 else cv2.INTER_CUBIC
+    recorte = cv2.resize(recorte, (max(1, int(round(w * escala))), alto), interpolation=interpolacion)
+    gray = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY) if recorte.ndim == 3 else recorte
+    return cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
+
+def separar_lineas(image, roi, alto_min=0.04):
+    """Rois de cada línea de texto de una caja de varias líneas ([roi] si no se distinguen)"""
+    import cv2
+    x1, y1, x2, y2 = roi
+    recorte = image[y1:y2, x1:x2]
+    h, w = recorte.shape[:2]
+    if h == 0 or w == 0:
+        return [roi]
+    gray = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY) if recorte.ndim == 3 else recorte
+    _, tinta = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    if tinta.mean() > 0.5:
+        tinta = 1 - tinta  # texto claro sobre fondo oscuro
+    perfil = tinta.sum(axis=1)
+    # Más tinta que la fila más limpia (descuenta los bordes verticales) y sin llegar a ser un filete
+    con_texto = (perfil > perfil.min() + 0.01 * w) & (perfil < 0.8 * w)
+
+    franjas = []
+    inicio = None
+    for y, hay in enumerate(np.append(con_texto, False)):
+        if hay and inicio is None:
+            inicio = y
+        elif not hay and inicio is not None:
+            if y - inicio >= max(2, alto_min * h):
+                franjas.append((inicio, y))
+            inicio = None
+    if not franjas:
+        return [roi]
+    # Cada línea con un margen de 1/4 de su alto, sin pasar de la mitad del hueco hasta la vecina
+    rois = []
+    for i, (a, b) in enumerate(franjas):
+        margen = (b - a) // 4
+        arriba = a - min(margen, (a - franjas[i - 1][1]) // 2) if i else max(a - margen, 0)
+        abajo = b + min(margen, (franjas[i + 1][0] - b) // 2) if i + 1 < len(franjas) else min(b + margen, h)
+        rois.append((x1, y1 + arriba, x2, y1 + abajo))
+    return rois
+
+def mosaico(parches, separacion=SEPARACION_MOSAICO):
+    """Apila los recortes en un lienzo: (lienzo, horizontal_list con [x1, x2, y1, y2] por recorte)"""
+    ancho = max(p.shape[1] for p in parches)
+    alto = sum(p.shape[0] for p in parches) + separacion * (len(parches) - 1)
+    lienzo = np.full((alto, ancho), 255, dtype=np.uint8)
+    horizontal_list = []
+    y = 0
+    for parche in parches:
+        h, w = parche.shape
+        lienzo[y:y + h, :w] = parche
+        horizontal_list.append([0, w, y, y + h])
+        y += h + separacion
+    return lienzo, horizontal_list
+
+def reducir_imagen(image, lado_max=LADO_MAX_COMPLETA):
+    h, w = image.shape[:2]
+    escala = lado_max / max(h, w)
+    if escala >= 1:
+        return image
+    import cv2
+    return cv2.resize(image, (int(w * escala), int(h * escala)), interpolation=cv2.INTER_AREA)
+
+def lote_maximo(weights_path):
+    """Imágenes por llamada que admite el modelo: None (sin límite) salvo en exportaciones de lote fijo"""
+    try:
+        if os.path.isdir(weights_path):
+            import yaml
+            with open(os.path.join(weights_path, 'metadata.yaml'), 'r', encoding='utf-8') as f:
+                metadatos = yaml.safe_load(f) or {}
+            # ultralytics guarda los argumentos de exportación en 'args' y solo 'batch' arriba
+            dinamico = (metadatos.get('args') or {}).get('dynamic', metadatos.get('dynamic'))
+            return None if dinamico else int(metadatos.get('batch') or 1)
+        if str(weights_path).lower().endswith('.onnx'):
+            import onnx
+            # Solo el grafo: los pesos externos no hacen falta para leer la forma de la entrada
+            modelo = onnx.load(str(weights_path), load_external_data=False)
+            dim = modelo.graph.input[0].type.tensor_type.shape.dim[0]
+            # Las dimensiones dinámicas vienen como nombre ('batch') en vez de como número
+            return dim.dim_value if dim.HasField('dim_value') else None
+    except Exception:
+        return 1  # exportación que no se puede inspeccionar: lo seguro es ir de una en una
+    return None
+
+def silencio(*args, **kwargs):
+    pass
+
+def info_carta(card, score):
+    return {"code": card.get('code'), "name": card.get('name'), "score": round(float(score), 4)}
+
+class CardScanner:
+    """Mantiene YOLO, easyocr y el catálogo cargados entre escaneos"""
+
+    def __init__(self, weights_path, json_path, pad=10, top_k=5, hashes_path=None, cache_dir=None,
+                 cache_memoria=256, cache_disco_mb=256, usar_cache=False, layout_fijo=False, modelos_dir=None,
+                 metricas=None, traza=False, presupuesto_match_ms=PRESUPUESTO_MATCH_MS, recargar=False,
+                 intervalo_recarga=2.0, log=print):
+        self.log = log or silencio
+        self.metricas = metricas or Metricas()
+        self.traza = traza
+        arranque = Cronometro()
+        self.modelos_dir = modelos_dir
+        if modelos_dir:
+            from model_bundle import verificar_bundle
+            with arranque.etapa('bundle'):
+                verificar_bundle(modelos_dir, log=self.log)
+        with arranque.etapa('importar'):
+            from ultralytics import YOLO
+            import easyocr  # noqa: F401 (se mide aquí su importación; la usa nuevo_lector)
+        with arranque.etapa('yolo'):
+            # task explícito para que también carguen los modelos exportados (.onnx, *_openvino_model/)
+            self.model = YOLO(weights_path, task='detect')
+            self.lote_max = lote_maximo(weights_path)
+        with arranque.etapa('easyocr'):
+            self.reader = self.nuevo_lector(verbose=self.log is not silencio)
+        self.lock_lector = threading.Lock()
+        with arranque.etapa('catalogo'):
+            self.catalogo = cargar_catalogo(json_path, log=self.log)
+        self.top_k = top_k
+        self.resolutor = ResolutorCartas(self.catalogo, leer_codigo, log=self.log)
+        self.presupuesto_match_ms = presupuesto_match_ms
+        self.pad = pad
+        self.indice_hashes = None
+        if hashes_path:
+            from card_hashes import IndiceHashes
+            self.indice_hashes = IndiceHashes(hashes_path)
+        self.layout_fijo = layout_fijo
+        self.cache = None
+        if usar_cache or cache_dir:
+            # Cambiar los pesos, el catálogo, los hashes o los parámetros invalida las entradas
+            self.contexto_fijo = [
+                huella_archivo(weights_path),
+                huella_archivo(hashes_path) if hashes_path else "-",
+                f"pad={pad}",
+                f"top_k={top_k}",
+                f"layout={layout_fijo}"
+            ]
+            self.cache = CacheResultados(self.contexto_cache(), cache_dir, max_memoria=cache_memoria,
+                                         max_disco_mb=cache_disco_mb)
+        self.vigilante = None
+        if recargar:
+            self.vigilante = VigilanteCatalogo(json_path, self.cambiar_catalogo, firmas=self.catalogo.firmas,
+                                               intervalo=intervalo_recarga, log=self.log).iniciar()
+        arranque.tiempos['total'] = sum(arranque.tiempos.values())
+        self.arranque_ms = arranque.como_dict()
+
+    # Se leen siempre del catálogo actual para seguir las recargas
+    @property
+    def cards(self):
+        return self.catalogo.cartas
+
+    @property
+    def indice_nombres(self):
+        return self.catalogo.indice_nombres
+
+    @property
+    def indice_keywords(self):
+        return self.catalogo.indice_keywords
+
+    def contexto_cache(self, catalogo=None):
+        catalogo = catalogo or self.catalogo
+        return ":".join([self.contexto_fijo[0], catalogo.version, *self.contexto_fijo[1:]])
+
+    def cambiar_catalogo(self, catalogo):
+        """Sustituye catálogo e índices sin parar el escáner (los escaneos en curso siguen con el suyo)"""
+        anterior = self.catalogo
+        self.catalogo = catalogo
+        self.resolutor.catalogo = catalogo
+        if self.cache is not None:
+            self.cache.cambiar_contexto(self.contexto_cache())
+        self.metricas.contar('scanner_recargas_catalogo_total')
+        self.log(f"🔄 Catálogo recargado: {len(anterior.cartas)} -> {len(catalogo.cartas)} cartas "
+                 f"(versión {anterior.version} -> {catalogo.version})")
+
+    def parar_recarga(self):
+        if self.vigilante is not None:
+            self.vigilante.parar()
+            self.vigilante = None
+
+    def nuevo_cronometro(self):
+        """Cronómetro de un escaneo que alimenta las métricas del escáner (y la traza si está activa)"""
+        return Cronometro(self.metricas, traza=self.traza)
+
+    def nuevo_lector(self, verbose=False):
+        """Lector easyocr (del bundle de modelos si lo hay, sin descargar nada)"""
+        import easyocr
+        if self.modelos_dir:
+            from model_bundle import ruta_easyocr
+            return easyocr.Reader(['en'], model_storage_directory=ruta_easyocr(self.modelos_dir),
+                                  download_enabled=False, verbose=verbose)
+        return easyocr.Reader(['en'], verbose=verbose)
+
+    def calentar(self):
+        """Ejecuta una inferencia en vacío para que el primer escaneo no pague la inicialización"""
+        dummy = np.full((640, 640, 3), 255, dtype=np.uint8)
+        self.model(dummy, conf=0.1, verbose=False)
+        self.leer_imagen(dummy[:64, :256])
+        self.log("🔥 Modelos calentados")
+
+    def cargar_imagen(self, source):
+        """Acepta una ruta, bytes codificados o una imagen ya decodificada"""
+        if isinstance(source, np.ndarray):
+            return source
+        import cv2
+        if isinstance(source, (bytes, bytearray)):
+            # imdecode lanza con un búfer vacío en vez de devolver None
+            if not source:
+                return None
+            try:
+                return cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+            except cv2.error:
+                return None
+        return cv2.imread(str(source))
+
+    def identificar(self, lecturas, catalogo=None):
+        """Ranking conjunto de las cajas leídas: (cartas con su confianza, detecciones por campo, completo)"""
+        estadisticas = {}
+        catalogo = catalogo or self.catalogo
+        resultado = self.resolutor.resolver(lecturas, top_k=self.top_k, presupuesto_ms=self.presupuesto_match_ms,
+                                            estadisticas=estadisticas, catalogo=catalogo)
+        self.metricas.observar('scanner_candidatos_evaluados', estadisticas.get('candidatos', 0), indice='resolutor')
+        detections = []
+        for evidencia in resultado["evidencias"]:
+            lectura = evidencia["lectura"]
+            mejores = sorted(evidencia["scores"].items(), key=lambda r: (-r[1], r[0]))[:self.top_k]
+            detection = {
+                "texto": lectura["texto"],
+                "metodo": evidencia["campo"],
+                "palabras": evidencia["palabras"],
+                "cartas": [info_carta(catalogo.cartas[card_id], score) for card_id, score in mejores],
+                "clase": lectura["clase"],
+                "caja": lectura.get("indice")
+            }
+            self.log(f"🔎 {detection['metodo']} ({detection['clase']}): {detection['palabras']} -> "
+                     f"{len(evidencia['scores'])} carta(s)")
+            detections.append(detection)
+        cartas = [info_carta(catalogo.cartas[card_id], confianza) for card_id, confianza in resultado["cartas"]]
+        if cartas:
+            self.log(f"🏆 {cartas[0]['code']} {cartas[0]['name']} (confianza {cartas[0]['score']:.2f})")
+        return cartas, detections, resultado["completo"]
+
+    def nombre_clase(self, class_id):
+        """Nombre de la clase YOLO de una caja (el que trae el modelo o el del entrenador)"""
+        names = getattr(self.model, 'names', None) or CLASES_TEXTO
+        return names.get(class_id, CLASES_TEXTO.get(class_id, str(class_id)))
+
+    def identificar_por_hash(self, image, crono, source=None, catalogo=None):
+        """Atajo por hash perceptual antes de YOLO y OCR: el registro si la coincidencia es clara, o None"""
+        if self.indice_hashes is None:
+            return None
+        with crono.etapa('hash'):
+            code, distancia = self.indice_hashes.buscar(image)
+        card = (catalogo or self.catalogo).buscar_codigo(code) if code else None
+        if card is None:
+            self.log(f"#️⃣ Hash perceptual ambiguo (distancia {distancia}), se sigue con OCR")
+            return None
+        self.log(f"#️⃣ Identificada por hash perceptual: {code} -> {card.get('name')} (distancia {distancia})")
+        detection = {
+            "texto": "",
+            "metodo": "phash",
+            "palabras": [],
+            "cartas": [info_carta(card, 1 - distancia / 64)],
+            "clase": "carta",
+            "caja": None,
+            "distancia": distancia
+        }
+        return construir_registro(source, [], [detection], crono)
+
+    def identificar_por_layout(self, image, crono, source=None, catalogo=None):
+        """Modo de diseño fijo: nombre y código de la carta rectificada sin YOLO; el registro o None"""
+        if not self.layout_fijo:
+            return None
+        from card_layout import encontrar_cuadrilatero, esquinas_imagen, homografia, recortar_campos
+        with crono.etapa('rectificar'):
+            esquinas = encontrar_cuadrilatero(image)
+            H = homografia(esquinas if esquinas is not None else esquinas_imagen(image))
+            recortes = recortar_campos(image, H)
+        with crono.etapa('ocr'):
+            textos = self.leer_parches([normalizar_roi(r, (0, 0, r.shape[1], r.shape[0])) for r, _ in recortes.values()])
+        cajas = [
+            {"indice": i, "clase": clase, "confianza": None, "xyxy": list(caja), "texto": text}
+            for i, ((clase, (_, caja)), text) in enumerate(zip(recortes.items(), textos))
+        ]
+        with crono.etapa('match'):
+            cartas, detections, completo = self.identificar([c for c in cajas if c["texto"]], catalogo)
+        if not suficiente(cartas):
+            self.log("📐 El diseño fijo no identificó la carta, se sigue con YOLO")
+            return None
+        self.log(f"📐 Identificada por diseño fijo ({'carta rectificada' if esquinas is not None else 'imagen completa'})")
+        return construir_registro(source, cajas, detections, crono, cartas=cartas, completo=completo)
+
+    def detectar(self, images):
+        """Ejecuta YOLO sobre un lote de imágenes (en trozos de lote_max si el modelo es de lote fijo)"""
+        if not self.lote_max or len(images) <= self.lote_max:
+            return self.model(images, conf=0.1, verbose=False)
+        resultados = []
+        for i in range(0, len(images), self.lote_max):
+            resultados.extend(self.model(images[i:i + self.lote_max], conf=0.1, verbose=False))
+        return resultados
+
+    def preparar(self, source, crono, catalogo=None):
+        """Decodifica la fuente y prueba caché y atajos: (image, clave_cache, registro si ya está resuelta)"""
+        catalogo = catalogo or self.catalogo
+        self.metricas.contar('scanner_escaneos_total')
+        with crono.etapa('decode'):
+            if isinstance(source, np.ndarray):
+                image, datos = source, None
             else:
-                text = ""
-                print(f"⚠️ No se detectó texto en caja {i+1}")
+                image = None
+                if isinstance(source, (bytes, bytearray)):
+                    datos = bytes(source)
+                else:
+                    try:
+                        with open(source, 'rb') as f:
+                            datos = f.read()
+                    except OSError as e:
+                        self.log(f"❌ Error: No se pudo leer la imagen: {source} ({e})")
+                        return None, None, registro_vacio(source, "imagen ilegible")
+                if not datos:
+                    self.log(f"❌ Error: Imagen vacía: {source if isinstance(source, str) else type(source).__name__}")
+                    return None, None, registro_vacio(source, "imagen ilegible")
+
+        clave = None
+        if self.cache is not None:
+            with crono.etapa('cache'):
+                if datos is None:
+                    datos_clave = repr(image.shape).encode('utf-8') + image.tobytes()
+                else:
+                    datos_clave = datos
+                clave = self.cache.clave(datos_clave, self.contexto_cache(catalogo))
+                registro, nivel = self.cache.get(clave)
+            self.metricas.contar('scanner_cache_total', resultado=nivel or 'fallo')
+            if registro is not None:
+                self.log(f"♻️ Resultado en caché ({nivel})")
+                registro = dict(registro, source=source if isinstance(source, str) else None, cache=nivel)
+                vacio = construir_registro(source, [], [], crono)
+                registro["tiempos_ms"] = vacio["tiempos_ms"]
+                if "traza" in vacio:
+                    registro["traza"] = vacio["traza"]
+                return None, clave, registro
+
+        if image is None:
+            with crono.etapa('decode'):
+                image = self.cargar_imagen(datos)
+        if image is None:
+            self.log(f"❌ Error: No se pudo leer la imagen: {source if isinstance(source, str) else type(source).__name__}")
+            return None, None, registro_vacio(source, "imagen ilegible")
+
+        registro = self.identificar_por_hash(image, crono, source=source, catalogo=catalogo) or \
+            self.identificar_por_layout(image, crono, source=source, catalogo=catalogo)
+        if registro:
+            self.guardar_en_cache(clave, registro)
+        return image, clave, registro
+
+    def guardar_en_cache(self, clave, registro):
+        # Un ranking cortado por el presupuesto de tiempo no se reutiliza
+        if clave is not None and self.cache is not None and registro.get("completo", True):
+            self.cache.put(clave, {k: v for k, v in registro.items() if k != "traza"})
+        return registro
+
+    def escanear(self, source):
+        """Escanea una imagen y devuelve su registro (cajas, detecciones, cartas y tiempos por etapa)"""
+        crono = self.nuevo_cronometro()
+        catalogo = self.catalogo
+        image, clave, registro = self.preparar(source, crono, catalogo)
+        if registro:
+            return registro
+        with crono.etapa('detect'):
+            results = self.detectar([image])[0]
+        return self.guardar_en_cache(clave, self.procesar(image, results, crono, source=source, catalogo=catalogo))
+
+    def escanear_lote(self, sources, batch_size=8):
+        """Escanea varias imágenes en mini-lotes y va entregando (fuente, registro) según terminan"""
+        for inicio in range(0, len(sources), batch_size):
+            lote = []
+            for source in sources[inicio:inicio + batch_size]:
+                crono = self.nuevo_cronometro()
+                catalogo = self.catalogo
+                image, clave, registro = self.preparar(source, crono, catalogo)
+                if registro:
+                    yield source, registro
+                    continue
+                lote.append((source, image, clave, crono, catalogo))
+            if not lote:
                 continue
 
-            # Buscar coincidencias primero por nombre
-            cartas_nombre, palabras_nombre = buscar_cartas_por_nombre_similar(text, cards, min_sim=0.6)
-            cartas_kw, palabras_kw = buscar_cartas_por_keywords(text, cards, keywords_ref, similarity_threshold=0.75)
-            
-            if cartas_nombre:
-                print(f"🃏 Cartas encontradas por nombre: {[c.get('name') for c in cartas_nombre]}")
-                print(f"🔠 Palabras que coincidieron: {palabras_nombre}")
-                detections.append((text, palabras_nombre, [c.get('name') for c in cartas_nombre]))
-            elif cartas_kw:
-                print(f"🃏 Cartas encontradas por palabras clave: {[c.get('name') for c in cartas_kw]}")
-                print(f"🔑 Palabras clave detectadas: {palabras_kw}")
-                detections.append((text, palabras_kw, [c.get('name') for c in cartas_kw]))
-            else:
-                print("❌ No se encontraron coincidencias para esta caja")
-    else:
-        print("❌ No se detectaron cajas. Intentando OCR en toda la imagen...")
-        result = reader.readtext(image)
+            inicio_detect = time.perf_counter()
+            resultados = self.detectar([image for _, image, _, _, _ in lote])
+            # La inferencia es conjunta: se reparte su duración entre las imágenes del lote
+            detect_ms = (time.perf_counter() - inicio_detect) * 1000 / len(lote)
+            for (source, image, clave, crono, catalogo), results in zip(lote, resultados):
+                crono.sumar('detect', detect_ms, inicio_detect)
+                yield source, self.guardar_en_cache(clave, self.procesar(image, results, crono, source=source,
+                                                                         catalogo=catalogo))
+
+    @contextmanager
+    def usar_lector(self, reader=None):
+        """Un lector propio (p. ej. de un hilo del pipeline) o el compartido, que no admite llamadas simultáneas"""
+        if reader is not None:
+            yield reader
+            return
+        with self.lock_lector:
+            yield self.reader
+
+    def leer_imagen(self, image, reader=None):
+        """OCR completo (detector CRAFT + reconocimiento) para cuando YOLO no encuentra cajas"""
+        image = reducir_imagen(image)
+        self.metricas.contar('scanner_llamadas_ocr_total', tipo='readtext')
+        with self.usar_lector(reader) as lector:
+            return lector.readtext(image)
+
+    def leer_cajas(self, image, cajas, reader=None, clases=None):
+        """Texto de cada caja de YOLO ('' si nada) con una sola llamada al reconocedor"""
+        clases = clases or [None] * len(cajas)
+        lineas = [separar_lineas(image, caja) if clase in CLASES_MULTILINEA else [caja]
+                  for caja, clase in zip(cajas, clases)]
+        textos = iter(self.leer_parches([normalizar_roi(image, roi) for rois in lineas for roi in rois], reader=reader))
+        return [" ".join(t for t in (next(textos) for _ in rois) if t) for rois in lineas]
+
+    def leer_parches(self, parches, reader=None):
+        """Reconoce recortes ya normalizados (None si la caja estaba vacía) en un único mosaico"""
+        validos = [i for i, p in enumerate(parches) if p is not None]
+        if not validos:
+            return ["" for _ in parches]
+        lienzo, horizontal_list = mosaico([parches[i] for i in validos])
+        self.metricas.contar('scanner_llamadas_ocr_total', tipo='recognize')
+        with self.usar_lector(reader) as lector:
+            result = lector.recognize(
+                lienzo,
+                horizontal_list=horizontal_list,
+                free_list=[],
+                batch_size=len(horizontal_list),
+                detail=1
+            )
+        # easyocr ordena la salida por posición vertical: se vuelve a asociar cada texto con su fila del mosaico
+        por_fila = {}
+        for bbox, text, _conf in result:
+            por_fila[int(bbox[0][1])] = text
+        textos = ["" for _ in parches]
+        for i, (_, _, y1, _) in zip(validos, horizontal_list):
+            textos[i] = por_fila.get(y1, "")
+        return textos
+
+    def procesar(self, image, results, crono=None, source=None, catalogo=None):
+        """OCR y búsqueda de cartas sobre el resultado de YOLO de una imagen"""
+        crono = crono or self.nuevo_cronometro()
+        cajas, full_text = self.leer(image, results, crono)
+        return self.resolver(image, cajas, full_text, crono, source=source, catalogo=catalogo)
+
+    def leer(self, image, results, crono, reader=None):
+        """Etapa de OCR: (cajas, texto de la imagen completa si YOLO no encontró cajas o None)"""
+        n_cajas = len(results.boxes) if results.boxes is not None else 0
+        self.metricas.observar('scanner_cajas_por_imagen', n_cajas)
+        self.log(f"📊 Detecciones encontradas: {n_cajas}")
+        cajas = []
+
+        if results.boxes is not None and len(results.boxes) > 0:
+            h, w = image.shape[:2]
+            for i, box in enumerate(results.boxes):
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                confidence = float(box.conf[0])
+                clase = self.nombre_clase(int(box.cls[0]))
+                self.log(f"🔍 Caja {i+1} ({clase}): confianza={confidence:.2f}, coordenadas=({x1},{y1},{x2},{y2})")
+                cajas.append({
+                    "indice": i,
+                    "clase": clase,
+                    "confianza": round(confidence, 4),
+                    "xyxy": [x1, y1, x2, y2],
+                    "texto": None,
+                    "roi": (
+                        max(x1 - self.pad, 0),
+                        max(y1 - self.pad, 0),
+                        min(x2 + self.pad, w),
+                        min(y2 + self.pad, h)
+                    )
+                })
+
+            # Primero solo las cajas que identifican la carta; el resto se lee bajo demanda
+            prioritarias = [c for c in cajas if es_prioritaria(c)]
+            with crono.etapa('ocr'):
+                textos = self.leer_cajas(image, [c["roi"] for c in prioritarias], reader=reader,
+                                         clases=[c["clase"] for c in prioritarias])
+            for caja, text in zip(prioritarias, textos):
+                caja["texto"] = text
+            return cajas, None
+
+        self.log("❌ No se detectaron cajas. Intentando OCR en toda la imagen...")
+        with crono.etapa('ocr'):
+            result = self.leer_imagen(image, reader=reader)
         if result:
             full_text = " ".join([r[1] for r in result])
-            print(f"📄 Texto completo detectado: {full_text}")
+            self.log(f"📄 Texto completo detectado: {full_text}")
         else:
             full_text = ""
-            print("⚠️ No se detectó texto en la imagen completa")
-        
-        cartas_nombre, palabras_nombre = buscar_cartas_por_nombre_similar(full_text, cards, min_sim=0.6)
-        cartas_kw, palabras_kw = buscar_cartas_por_keywords(full_text, cards, keywords_ref, similarity_threshold=0.75)
-        
-        if cartas_nombre:
-            print(f"🃏 Cartas encontradas por nombre: {[c.get('name') for c in cartas_nombre]}")
-            print(f"🔠 Palabras que coincidieron: {palabras_nombre}")
-            detections.append((full_text, palabras_nombre, [c.get('name') for c in cartas_nombre]))
-        elif cartas_kw:
-            print(f"🃏 Cartas encontradas por palabras clave: {[c.get('name') for c in cartas_kw]}")
-            print(f"🔑 Palabras clave detectadas: {palabras_kw}")
-            detections.append((full_text, palabras_kw, [c.get('name') for c in cartas_kw]))
+            self.log("⚠️ No se detectó texto en la imagen completa")
+        return cajas, full_text
+
+    def resolver(self, image, cajas, full_text, crono, source=None, reader=None, catalogo=None):
+        """Etapa de búsqueda: identifica la carta y construye el registro"""
+        if cajas:
+            with crono.etapa('match'):
+                cartas, detections, completo = self.identificar([c for c in cajas if c["texto"]], catalogo)
+
+            secundarias = [c for c in cajas if not es_prioritaria(c)]
+            if secundarias and not suficiente(cartas):
+                self.log("🔁 Sin identificación clara por código o nombre: leyendo el resto de cajas")
+                with crono.etapa('ocr'):
+                    textos = self.leer_cajas(image, [c["roi"] for c in secundarias], reader=reader,
+                                             clases=[c["clase"] for c in secundarias])
+                for caja, text in zip(secundarias, textos):
+                    caja["texto"] = text
+                with crono.etapa('match'):
+                    cartas, detections, completo = self.identificar([c for c in cajas if c["texto"]], catalogo)
         else:
-            print("❌ No se encontraron coincidencias en la imagen completa")
+            with crono.etapa('match'):
+                cartas, detections, completo = self.identificar(
+                    [{"clase": "imagen_completa", "texto": full_text or "", "indice": None}], catalogo
+                )
+        if not cartas:
+            self.log("❌ No se encontraron coincidencias")
 
+        for caja in cajas:
+            caja.pop("roi", None)
+        return construir_registro(source, cajas, detections, crono, cartas=cartas, completo=completo)
+
+def suficiente(cartas):
+    return bool(cartas) and cartas[0]["score"] >= CONFIANZA_SUFICIENTE
+
+def es_prioritaria(caja):
+    """Cajas que identifican la carta por sí solas (código y nombre, o clases desconocidas)"""
+    return caja["clase"] in CLASES_PRIORITARIAS or caja["clase"] not in CLASES_TEXTO.values()
+
+def construir_registro(source, cajas, detections, crono, cartas=None, completo=True):
+    """Registro de un escaneo terminado; sin `cartas` el ranking se saca de las detecciones"""
+    crono.tiempos['total'] = sum(ms for etapa, ms in crono.tiempos.items() if etapa != 'total')
+    crono.observar()
+    registro = {
+        "source": source if isinstance(source, str) else None,
+        "cajas": cajas,
+        "detecciones": detections,
+        "cartas": ranking_cartas(detections) if cartas is None else cartas,
+        "completo": completo,
+        "tiempos_ms": crono.como_dict()
+    }
+    if crono.eventos is not None:
+        registro["traza"] = crono.traza()
+    return registro
+
+def registro_vacio(source, error=None):
+    registro = {
+        "source": source if isinstance(source, str) else None,
+        "cajas": [],
+        "detecciones": [],
+        "cartas": [],
+        "tiempos_ms": {}
+    }
+    if error:
+        registro["error"] = error
+    return registro
+
+def ranking_cartas(detections):
+    """Une las cartas de todas las detecciones quedándose con el mejor score de cada una"""
+    mejores = {}
+    for detection in detections:
+        for carta in detection["cartas"]:
+            clave = carta["code"] or carta["name"]
+            if clave not in mejores or carta["score"] > mejores[clave]["score"]:
+                mejores[clave] = carta
+    return sorted(mejores.values(), key=lambda c: -c["score"])
+
+def imprimir_resultados(registro):
+    detections = registro["detecciones"]
     print("\n🧠 Resultados finales:")
     if detections:
-        for text, keywords, cartas in detections:
-            print(f"\n📄 Texto: {text.strip()}")
-            print(f"🔤 Palabras encontradas: {keywords}")
-            print(f"🃏 Cartas detectadas: {cartas}")
+        for detection in detections:
+            print(f"\n📄 Texto: {detection['texto'].strip()}")
+            print(f"🔤 Palabras encontradas: {detection['palabras']}")
+            print(f"🃏 Cartas detectadas: {[c['name'] or c['code'] for c in detection['cartas']]}")
+        print("\n🏆 Ranking:")
+        for carta in registro["cartas"]:
+            print(f"   {carta['code']}  {carta['name'] or '-'}  ({carta['score']:.2f})")
+        if not registro.get("completo", True):
+            print("⏳ Ranking parcial: el presupuesto de búsqueda dejó campos sin evaluar")
     else:
         print("❌ No se encontraron cartas en esta imagen")
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def expandir_fuentes(source):
+    """Convierte --source (imagen, carpeta, patrón glob o archivo .txt con rutas) en una lista de imágenes"""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(source, f) for f in os.listdir(source)
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    if source.lower().endswith('.txt') and os.path.isfile(source):
+        with open(source, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if glob.has_magic(source):
+        return sorted(p for p in glob.glob(source, recursive=True) if p.lower().endswith(IMAGE_EXTENSIONS))
+    return [source]
+
+def scan_card(image_path, weights_path, json_path):
+    scanner = CardScanner(weights_path, json_path)
+    registro = scanner.escanear(image_path)
+    imprimir_resultados(registro)
+    return registro
         
 if __name__ == "__main__":
+    INICIO_PROCESO = time.perf_counter()
     parser = argparse.ArgumentParser(description="Escáner de cartas con YOLO + OCR")
-    parser.add_argument('--source', required=True, help="Ruta a la imagen")
-    parser.add_argument('--weights', required=True, help="Ruta al modelo entrenado")
+    parser.add_argument('--source', required=True, help="Ruta a la imagen, carpeta, patrón glob o archivo .txt con rutas")
+    parser.add_argument('--weights', help="Ruta al modelo entrenado (.pt, .onnx o carpeta *_openvino_model); "
+                                          "por defecto el del bundle de --modelos")
     parser.add_argument('--json', required=True, help="Ruta al archivo JSON de cartas")
+    parser.add_argument('--batch-size', type=int, default=8, help="Imágenes por lote de inferencia YOLO")
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text',
+                        help="text: salida legible; jsonl: un registro JSON por imagen en stdout")
+    parser.add_argument('--quiet', action='store_true', help="No escribir mensajes de progreso")
+    parser.add_argument('--hashes', help="JSON de hashes perceptuales de referencia (card_hashes.py) para identificar sin OCR")
+    parser.add_argument('--cache-dir', help="Carpeta para la caché en disco de resultados (se reutilizan en escaneos repetidos)")
+    parser.add_argument('--cache-mb', type=int, default=256, help="Tamaño máximo de la caché en disco en MB")
+    parser.add_argument('--layout', action='store_true',
+                        help="Leer nombre y código en sus posiciones fijas de la carta antes de recurrir a YOLO")
+    parser.add_argument('--modelos', help="Bundle local de modelos (model_bundle.py) para funcionar sin red")
+    parser.add_argument('--presupuesto-arranque', type=float,
+                        help="Milisegundos máximos de arranque (importaciones y carga de modelos); avisa si se superan")
+    parser.add_argument('--presupuesto-match', type=float, default=PRESUPUESTO_MATCH_MS,
+                        help="Milisegundos máximos para combinar los campos leídos de cada imagen")
+    parser.add_argument('--recarga', type=float, default=0,
+                        help="Segundos entre comprobaciones de cambios en el catálogo para recargarlo sin parar "
+                             "(0, por defecto, lo desactiva)")
+    parser.add_argument('--metricas', help="Archivo donde escribir al final las métricas en formato Prometheus")
+    parser.add_argument('--traza', help="Carpeta donde guardar una traza de Chrome (JSON) por imagen escaneada")
 
     args = parser.parse_args()
 
     # Verificar que los archivos existan
-    if not os.path.exists(args.source):
-        print(f"❌ Error: La imagen no existe: {args.source}")
+    sources = expandir_fuentes(args.source)
+    if not sources or (len(sources) == 1 and not os.path.exists(sources[0])):
+        print(f"❌ Error: La imagen no existe: {args.source}", file=sys.stderr)
         sys.exit(1)
     
+    if args.modelos and not args.weights:
+        from model_bundle import pesos_bundle
+        args.weights = pesos_bundle(args.modelos)
+
+    if not args.weights:
+        print("❌ Error: Indica --weights o un bundle de --modelos que incluya los pesos", file=sys.stderr)
+        sys.exit(1)
+
     if not os.path.exists(args.weights):
-        print(f"❌ Error: El modelo no existe: {args.weights}")
+        print(f"❌ Error: El modelo no existe: {args.weights}", file=sys.stderr)
         sys.exit(1)
     
     if not os.path.exists(args.json):
-        print(f"❌ Error: El archivo JSON no existe: {args.json}")
+        print(f"❌ Error: El archivo JSON no existe: {args.json}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.quiet:
+        log = silencio
+    elif args.format == 'jsonl':
+        # stdout queda reservado para los registros JSON
+        log = functools.partial(print, file=sys.stderr)
+    else:
+        log = print
+
+    if args.hashes and not os.path.exists(args.hashes):
+        print(f"❌ Error: El archivo de hashes no existe: {args.hashes}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        scanner = CardScanner(args.weights, args.json, hashes_path=args.hashes, cache_dir=args.cache_dir,
+                              cache_disco_mb=args.cache_mb, layout_fijo=args.layout, modelos_dir=args.modelos,
+                              traza=bool(args.traza), presupuesto_match_ms=args.presupuesto_match,
+                              recargar=args.recarga > 0, intervalo_recarga=args.recarga, log=log)
+    except ValueError as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
         sys.exit(1)
+    arranque_ms = (time.perf_counter() - INICIO_PROCESO) * 1000
+    log(f"🚀 Arranque en {arranque_ms:.0f} ms ({', '.join(f'{k} {v:.0f}' for k, v in scanner.arranque_ms.items())})")
+    if args.presupuesto_arranque and arranque_ms > args.presupuesto_arranque:
+        print(f"⚠️ El arranque ({arranque_ms:.0f} ms) supera el presupuesto de {args.presupuesto_arranque:.0f} ms",
+              file=sys.stderr)
+    if len(sources) > 1:
+        log(f"📂 {len(sources)} imágenes a escanear en lotes de {args.batch_size}")
+    if args.traza:
+        os.makedirs(args.traza, exist_ok=True)
+    for n, (source, registro) in enumerate(scanner.escanear_lote(sources, batch_size=max(1, args.batch_size))):
+        traza = registro.pop("traza", None)
+        if args.traza and traza:
+            nombre = os.path.splitext(os.path.basename(source))[0] if isinstance(source, str) else "imagen"
+            with open(os.path.join(args.traza, f"{n:04d}_{nombre}.trace.json"), 'w', encoding='utf-8') as f:
+                json.dump(traza, f)
+        if args.format == 'jsonl':
+            sys.stdout.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+        elif not args.quiet:
+            if len(sources) > 1:
+                print(f"\n📸 {source}")
+            imprimir_resultados(registro)
 
-    scan_card(args.source, args.weights, args.json)
\ No newline at end of file
+    if args.metricas:
+        scanner.metricas.guardar_prometheus(args.metricas)
+        log(f"📈 Métricas guardadas en {args.metricas}")
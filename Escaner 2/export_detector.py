@@ -0,0 +1,155 @@
+import argparse
+import glob
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def exportar(weights_path, formato='onnx', imgsz=640):
+    """Exporta best.pt a ONNX o OpenVINO (FP32) con ultralytics y devuelve la ruta generada.
+
+    El lote es dinámico porque el escáner manda a YOLO varias imágenes por llamada (--batch-size).
+    """
+    model = YOLO(weights_path)
+    ruta = model.export(format=formato, imgsz=imgsz, dynamic=True, simplify=(formato == 'onnx'))
+    print(f"📦 Modelo exportado a {formato}: {ruta}")
+    return str(ruta)
+
+def preprocesar(image, imgsz=640):
+    """Letterbox igual que ultralytics: lado mayor a imgsz, relleno gris 114, RGB, CHW, [0, 1]"""
+    h, w = image.shape[:2]
+    escala = imgsz / max(h, w)
+    nw, nh = int(round(w * escala)), int(round(h * escala))
+    resized = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    lienzo = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    lienzo[top:top + nh, left:left + nw] = resized
+    rgb = lienzo[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(rgb, dtype=np.float32)[None] / 255.0
+
+class CalibracionCartas:
+    """Lector de calibración para la cuantización estática: una imagen de cartas_prueba por paso"""
+
+    def __init__(self, carpeta, input_name, imgsz=640, max_imagenes=100):
+        self.paths = sorted(p for p in glob.glob(os.path.join(carpeta, '*')) if p.lower().endswith(IMAGE_EXTENSIONS))
+        self.paths = self.paths[:max_imagenes]
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.iterador = iter(self.paths)
+
+    def get_next(self):
+        for path in self.iterador:
+            image = cv2.imread(path)
+            if image is not None:
+                return {self.input_name: preprocesar(image, self.imgsz)}
+        return None
+
+    def rewind(self):
+        self.iterador = iter(self.paths)
+
+def cuantizar_int8(onnx_path, calibracion_dir, imgsz=640):
+    """Cuantización estática int8 (QDQ) con onnxruntime, calibrada con las imágenes de calibracion_dir"""
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class _Lector(CalibracionCartas, CalibrationDataReader):
+        pass
+
+    input_name = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    lector = _Lector(calibracion_dir, input_name, imgsz)
+    if not lector.paths:
+        raise ValueError(f"No hay imágenes de calibración en {calibracion_dir}")
+
+    salida = str(Path(onnx_path).with_name(Path(onnx_path).stem + '_int8.onnx'))
+    print(f"⚖️ Calibrando int8 con {len(lector.paths)} imágenes de {calibracion_dir}...")
+    quantize_static(
+        onnx_path,
+        salida,
+        lector,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8
+    )
+
+    # ultralytics lee los nombres de clase e imgsz de los metadatos del ONNX: se copian al modelo cuantizado
+    original, cuantizado = onnx.load(onnx_path), onnx.load(salida)
+    if not cuantizado.metadata_props:
+        cuantizado.metadata_props.extend(original.metadata_props)
+        onnx.save(cuantizado, salida)
+    print(f"📦 Modelo int8 guardado en {salida}")
+    return salida
+
+def preparar_data_yaml(data_yaml):
+    """Copia temporal del config.yaml del dataset con 'path' apuntando a su carpeta real"""
+    with open(data_yaml, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['path'] = str(Path(data_yaml).resolve().parent)
+    temporal = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False, encoding='utf-8')
+    with temporal:
+        yaml.safe_dump(config, temporal)
+    return temporal.name
+
+def comparar(modelos, data_yaml, imgsz=640):
+    """Valida cada modelo en CPU y muestra mAP y velocidad de inferencia frente al primero (PyTorch)"""
+    data = preparar_data_yaml(data_yaml)
+    filas = []
+    try:
+        for etiqueta, ruta in modelos:
+            print(f"\n🧪 Validando {etiqueta}: {ruta}")
+            metrics = YOLO(ruta, task='detect').val(
+                data=data, imgsz=imgsz, batch=1, device='cpu', plots=False, verbose=False
+            )
+            filas.append((etiqueta, metrics.box.map50, metrics.box.map, metrics.speed['inference']))
+    finally:
+        os.remove(data)
+
+    _, map50_base, map_base, ms_base = filas[0]
+    print("\n📊 Comparación frente a PyTorch:")
+    print(f"{'modelo':<14}{'mAP50':>8}{'ΔmAP50':>9}{'mAP50-95':>10}{'ΔmAP':>8}{'ms/img':>9}{'speedup':>9}")
+    for etiqueta, map50, map5095, ms in filas:
+        print(f"{etiqueta:<14}{map50:>8.3f}{map50 - map50_base:>+9.3f}{map5095:>10.3f}"
+              f"{map5095 - map_base:>+8.3f}{ms:>9.1f}{ms_base / ms if ms else 0:>8.2f}x")
+    return filas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta el detector de texto a ONNX/OpenVINO para CPU")
+    parser.add_argument('--weights', required=True, help="Ruta a runs/detect/.../weights/best.pt")
+    parser.add_argument('--formato', choices=['onnx', 'openvino'], default='onnx', help="Formato de exportación")
+    parser.add_argument('--int8', action='store_true', help="Cuantización estática int8 (solo ONNX)")
+    parser.add_argument('--calibracion', default='cartas_prueba', help="Imágenes para calibrar la cuantización")
+    parser.add_argument('--data', default='dataset/config.yaml', help="config.yaml del dataset para comparar mAP")
+    parser.add_argument('--imgsz', type=int, default=640, help="Tamaño de entrada del modelo")
+    parser.add_argument('--sin-comparar', action='store_true', help="No validar ni comparar con PyTorch")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        print(f"❌ Error: El modelo no existe: {args.weights}")
+        sys.exit(1)
+
+    if args.int8 and args.formato != 'onnx':
+        print("❌ Error: --int8 solo está disponible con --formato onnx")
+        sys.exit(1)
+
+    modelos = [('pytorch', args.weights)]
+    exportado = exportar(args.weights, args.formato, args.imgsz)
+    modelos.append((args.formato, exportado))
+    if args.int8:
+        modelos.append(('onnx-int8', cuantizar_int8(exportado, args.calibracion, args.imgsz)))
+
+    if not args.sin_comparar:
+        if not os.path.exists(args.data):
+            print(f"❌ Error: El config.yaml del dataset no existe: {args.data}")
+            sys.exit(1)
+        comparar(modelos, args.data, args.imgsz)
+
+    print(f"\n✅ Para escanear con el modelo exportado: card_scanner.py --weights {modelos[-1][1]}")
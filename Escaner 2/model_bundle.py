@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+
+from scan_cache import huella_archivo
+
+BUNDLE_VERSION = 1
+MANIFIESTO = 'manifest.json'
+# Sello con tamaño y fecha de los archivos ya verificados: si no cambian no se vuelve a calcular su sha256
+SELLO = '.verificado.json'
+# Detector CRAFT y reconocedor latino que easyocr.Reader(['en']) descarga la primera vez
+MODELOS_EASYOCR = ('craft_mlt_25k.pth', 'english_g2.pth')
+EASYOCR_DIR = os.path.join(os.path.expanduser('~'), '.EasyOCR', 'model')
+
+def ruta_easyocr(directorio):
+    return os.path.join(directorio, 'easyocr')
+
+def pesos_bundle(directorio):
+    """Ruta de los pesos de YOLO incluidos en el bundle, o None si no tiene"""
+    try:
+        with open(os.path.join(directorio, MANIFIESTO), 'r', encoding='utf-8') as f:
+            weights = json.load(f).get("weights")
+    except (OSError, ValueError):
+        return None
+    return os.path.join(directorio, weights) if weights else None
+
+def _copiar(origen, directorio, relativa, archivos, log):
+    destino = os.path.join(directorio, relativa)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    if os.path.isdir(origen):
+        shutil.copytree(origen, destino, dirs_exist_ok=True)
+        rutas = [os.path.join(raiz, f) for raiz, _, fs in os.walk(destino) for f in fs]
+    else:
+        shutil.copy2(origen, destino)
+        rutas = [destino]
+    for ruta in rutas:
+        clave = os.path.relpath(ruta, directorio).replace(os.sep, '/')
+        archivos[clave] = {"sha256": huella_archivo(ruta), "bytes": os.path.getsize(ruta)}
+        log(f"📦 {clave}")
+
+def crear_bundle(directorio, weights_path=None, easyocr_dir=EASYOCR_DIR, log=print):
+    """Copia los modelos de easyocr (y opcionalmente los pesos de YOLO) a `directorio` con su manifiesto"""
+    faltan = [m for m in MODELOS_EASYOCR if not os.path.exists(os.path.join(easyocr_dir, m))]
+    if faltan:
+        raise FileNotFoundError(
+            f"Faltan modelos de easyocr en {easyocr_dir}: {', '.join(faltan)} "
+            "(ejecuta easyocr una vez con red o cópialos a mano)"
+        )
+    archivos = {}
+    for modelo in MODELOS_EASYOCR:
+        _copiar(os.path.join(easyocr_dir, modelo), directorio, f"easyocr/{modelo}", archivos, log)
+    weights = None
+    if weights_path:
+        weights = f"weights/{os.path.basename(os.path.normpath(weights_path))}"
+        _copiar(weights_path, directorio, weights, archivos, log)
+
+    manifiesto = {"version": BUNDLE_VERSION, "weights": weights, "archivos": archivos}
+    with open(os.path.join(directorio, MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+    log(f"✅ Bundle creado en {directorio} ({len(archivos)} archivos)")
+    return manifiesto
+
+def verificar_bundle(directorio, completo=False, log=print):
+    """Comprueba los archivos del bundle contra el manifiesto y devuelve el manifiesto.
+
+    Solo se recalcula el sha256 de los archivos cuyo tamaño o fecha cambió desde
+    la última verificación correcta (o de todos con completo=True), para no pagar
+    cientos de MB de hashing en cada arranque. Lanza ValueError si algo no cuadra.
+    """
+    ruta_manifiesto = os.path.join(directorio, MANIFIESTO)
+    if not os.path.exists(ruta_manifiesto):
+        raise ValueError(f"No hay {MANIFIESTO} en el bundle de modelos: {directorio}")
+    with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    if manifiesto.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"Versión de bundle no soportada: {manifiesto.get('version')}")
+
+    ruta_sello = os.path.join(directorio, SELLO)
+    sello = {}
+    if not completo and os.path.exists(ruta_sello):
+        try:
+            with open(ruta_sello, 'r', encoding='utf-8') as f:
+                sello = json.load(f)
+        except ValueError:
+            sello = {}
+
+    errores = []
+    nuevo_sello = {}
+    for relativa, esperado in manifiesto["archivos"].items():
+        ruta = os.path.join(directorio, relativa)
+        try:
+            st = os.stat(ruta)
+        except OSError:
+            errores.append(f"falta {relativa}")
+            continue
+        firma = [st.st_size, st.st_mtime_ns, esperado["sha256"]]
+        if sello.get(relativa) != firma:
+            if st.st_size != esperado["bytes"] or huella_archivo(ruta) != esperado["sha256"]:
+                errores.append(f"{relativa} no coincide con el manifiesto")
+                continue
+            log(f"🔐 Verificado {relativa}")
+        nuevo_sello[relativa] = firma
+    if errores:
+        raise ValueError("Bundle de modelos corrupto: " + "; ".join(errores))
+
+    if nuevo_sello != sello:
+        try:
+            with open(ruta_sello, 'w', encoding='utf-8') as f:
+                json.dump(nuevo_sello, f)
+        except OSError:
+            pass  # bundle de solo lectura: se verificará entero la próxima vez
+    return manifiesto
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crea o verifica el bundle local de modelos para equipos sin red")
+    parser.add_argument('accion', choices=['crear', 'verificar'])
+    parser.add_argument('--dir', default='modelos', help="Carpeta del bundle")
+    parser.add_argument('--weights', help="Pesos de YOLO a incluir en el bundle (.pt, .onnx o carpeta *_openvino_model)")
+    parser.add_argument('--easyocr-dir', default=EASYOCR_DIR, help="Carpeta con los modelos descargados de easyocr")
+
+    args = parser.parse_args()
+
+    try:
+        if args.accion == 'crear':
+            if args.weights and not os.path.exists(args.weights):
+                print(f"❌ Error: El modelo no existe: {args.weights}")
+                sys.exit(1)
+            crear_bundle(args.dir, args.weights, args.easyocr_dir)
+        else:
+            manifiesto = verificar_bundle(args.dir, completo=True)
+            print(f"✅ Bundle correcto: {len(manifiesto['archivos'])} archivos")
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from card_catalog import clave_codigo
+from card_scanner import CardScanner, expandir_fuentes, silencio
+
+def rss_maximo_mb():
+    """Pico de memoria residente del proceso en MB (None si la plataforma no lo expone)"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / 2 ** 20, 1)
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return round(maximo / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+def casos_prueba(carpeta):
+    """(ruta, código esperado) de cada imagen cuyo nombre es un código de carta"""
+    casos = []
+    for path in expandir_fuentes(carpeta):
+        code = clave_codigo(os.path.splitext(os.path.basename(path))[0])
+        if code is None:
+            print(f"⚠️ Nombre sin código de carta, se omite: {path}", file=sys.stderr)
+            continue
+        casos.append((path, code))
+    return casos
+
+def ejecutar(scanner, casos, top_k=5, batch_size=8):
+    """Escanea los casos y devuelve el resumen de precisión, velocidad, latencias y memoria"""
+    esperado = dict(casos)
+    por_etapa = defaultdict(list)
+    aciertos_top1 = aciertos_topk = 0
+    fallos = []
+
+    inicio = time.perf_counter()
+    for source, registro in scanner.escanear_lote([path for path, _ in casos], batch_size=batch_size):
+        codes = [clave_codigo(c["code"]) for c in registro["cartas"][:top_k]]
+        if codes and codes[0] == esperado[source]:
+            aciertos_top1 += 1
+        else:
+            fallos.append({"source": source, "esperado": esperado[source], "obtenido": codes[:1] or None})
+        if esperado[source] in codes:
+            aciertos_topk += 1
+        for etapa, ms in registro["tiempos_ms"].items():
+            por_etapa[etapa].append(ms)
+    segundos = time.perf_counter() - inicio
+
+    n = len(casos)
+    return {
+        "imagenes": n,
+        "top_k": top_k,
+        "top1": round(aciertos_top1 / n, 4),
+        "topk": round(aciertos_topk / n, 4),
+        "img_s": round(n / segundos, 3) if segundos else 0.0,
+        "etapas_ms": {
+            etapa: {
+                "p50": round(float(np.percentile(valores, 50)), 2),
+                "p95": round(float(np.percentile(valores, 95)), 2),
+                "n": len(valores)
+            }
+            for etapa, valores in sorted(por_etapa.items())
+        },
+        "rss_max_mb": rss_maximo_mb(),
+        "fallos": fallos
+    }
+
+def imprimir(resumen):
+    print(f"\n📊 {resumen['imagenes']} imágenes")
+    print(f"🎯 top-1: {resumen['top1']:.1%}   top-{resumen['top_k']}: {resumen['topk']:.1%}")
+    print(f"⏱️ {resumen['img_s']:.2f} img/s   💾 RSS máximo: {resumen['rss_max_mb']} MB")
+    print(f"{'etapa':<12}{'p50 ms':>10}{'p95 ms':>10}{'n':>6}")
+    for etapa, stats in resumen["etapas_ms"].items():
+        print(f"{etapa:<12}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['n']:>6}")
+    for fallo in resumen["fallos"]:
+        print(f"❌ {os.path.basename(fallo['source'])}: esperado {fallo['esperado']}, obtenido {fallo['obtenido']}")
+
+def comparar(resumen, base, tolerancia_velocidad=0.15, tolerancia_latencia=0.25):
+    """Lista de regresiones frente a la línea base (vacía si no hay ninguna).
+
+    La precisión no puede bajar nada; la velocidad y la latencia p95 total
+    admiten un margen porque dependen de la carga de la máquina.
+    """
+    regresiones = []
+    for metrica in ("top1", "topk"):
+        if resumen[metrica] < base[metrica]:
+            regresiones.append(f"{metrica} bajó de {base[metrica]:.1%} a {resumen[metrica]:.1%}")
+    if resumen["img_s"] < base["img_s"] * (1 - tolerancia_velocidad):
+        regresiones.append(f"img/s bajó de {base['img_s']:.2f} a {resumen['img_s']:.2f}")
+    p95, p95_base = resumen["etapas_ms"].get("total", {}).get("p95"), base["etapas_ms"].get("total", {}).get("p95")
+    if p95 is not None and p95_base and p95 > p95_base * (1 + tolerancia_latencia):
+        regresiones.append(f"p95 total subió de {p95_base:.1f} ms a {p95:.1f} ms")
+    nuevos = {f["source"] for f in resumen["fallos"]} - {f["source"] for f in base["fallos"]}
+    for source in sorted(nuevos):
+        regresiones.append(f"nuevo fallo: {os.path.basename(source)}")
+    return regresiones
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de precisión y velocidad del escáner sobre imágenes nombradas por código")
+    parser.add_argument('--source', default='cartas_prueba', help="Carpeta con imágenes nombradas por código (OOF-02.png, ...)")
+    parser.add_argument('--weights', required=True, help="Ruta al modelo entrenado (.pt, .onnx o carpeta *_openvino_model)")
+    parser.add_argument('--json', required=True, help="Ruta al archivo JSON de cartas")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="JSON de la línea base con la que comparar")
+    parser.add_argument('--guardar', action='store_true', help="Guardar este resultado como nueva línea base")
+    parser.add_argument('--top-k', type=int, default=5, help="k para la precisión top-k")
+    parser.add_argument('--batch-size', type=int, default=8, help="Imágenes por lote de YOLO")
+    parser.add_argument('--tolerancia-velocidad', type=float, default=0.15, help="Caída de img/s admitida (fracción)")
+    parser.add_argument('--tolerancia-latencia', type=float, default=0.25, help="Subida de la latencia p95 admitida (fracción)")
+    parser.add_argument('--hashes', help="JSON de hashes perceptuales de referencia")
+    parser.add_argument('--layout', action='store_true', help="Leer nombre y código en sus posiciones fijas antes de YOLO")
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source):
+        print(f"❌ Error: La carpeta no existe: {args.source}")
+        sys.exit(1)
+
+    if not os.path.exists(args.weights):
+        print(f"❌ Error: El modelo no existe: {args.weights}")
+        sys.exit(1)
+
+    if not os.path.exists(args.json):
+        print(f"❌ Error: El archivo JSON no existe: {args.json}")
+        sys.exit(1)
+
+    casos = casos_prueba(args.source)
+    if not casos:
+        print(f"❌ Error: No hay imágenes nombradas por código en {args.source}")
+        sys.exit(1)
+
+    # Sin caché de resultados: se mide el escaneo completo de cada imagen
+    scanner = CardScanner(args.weights, args.json, top_k=args.top_k, hashes_path=args.hashes,
+                          layout_fijo=args.layout, log=silencio)
+    scanner.calentar()
+    resumen = ejecutar(scanner, casos, top_k=args.top_k, batch_size=max(1, args.batch_size))
+    imprimir(resumen)
+
+    if args.guardar or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Línea base guardada en {args.baseline}")
+        sys.exit(0)
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    regresiones = comparar(resumen, base, args.tolerancia_velocidad, args.tolerancia_latencia)
+    if regresiones:
+        print(f"\n🚨 REGRESIÓN frente a {args.baseline}:")
+        for regresion in regresiones:
+            print(f"   ❌ {regresion}")
+        sys.exit(1)
+    print(f"\n✅ Sin regresiones frente a {args.baseline} "
+          f"(top-1 {base['top1']:.1%} -> {resumen['top1']:.1%}, {base['img_s']:.2f} -> {resumen['img_s']:.2f} img/s)")
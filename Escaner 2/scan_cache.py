@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+def huella_archivo(path):
+    """sha256 del contenido de un archivo, o de todos los archivos de una carpeta (p. ej. *_openvino_model/)"""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        for raiz, _, archivos in sorted(os.walk(path)):
+            for nombre in sorted(archivos):
+                h.update(nombre.encode('utf-8'))
+                with open(os.path.join(raiz, nombre), 'rb') as f:
+                    for bloque in iter(lambda: f.read(1 << 20), b''):
+                        h.update(bloque)
+    else:
+        with open(path, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloque)
+    return h.hexdigest()
+
+class CacheResultados:
+    """Caché de registros de escaneo en dos niveles: LRU en memoria y archivos JSON en disco.
+
+    La clave combina el hash de los bytes de la imagen con un contexto (hash de
+    los pesos, versión del catálogo...), así que cambiar el modelo o el catálogo
+    invalida las entradas sin tener que borrarlas: simplemente dejan de usarse
+    y el disco las va desalojando por antigüedad cuando supera max_disco_mb.
+    Los registros se guardan como texto JSON y cada get() devuelve una copia nueva.
+    """
+
+    def __init__(self, contexto, directorio=None, max_memoria=256, max_disco_mb=256):
+        self.contexto = contexto.encode('utf-8')
+        self.memoria = OrderedDict()
+        self.max_memoria = max_memoria
+        self.directorio = directorio
+        self.max_disco = max_disco_mb * 1024 * 1024
+        self.lock = threading.Lock()
+        self.aciertos = {"memoria": 0, "disco": 0, "fallos": 0}
+        self.bytes_disco = 0
+        # Bytes escritos desde la última medida de la carpeta (otros procesos también escriben en ella)
+        self.escritos = 0
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+            self.bytes_disco = self._medir_disco()
+
+    def cambiar_contexto(self, contexto):
+        """Nuevo contexto (p. ej. tras recargar el catálogo): las entradas anteriores dejan de usarse"""
+        with self.lock:
+            self.contexto = contexto.encode('utf-8')
+            self.memoria.clear()
+
+    def clave(self, datos, contexto=None):
+        """Clave de unos bytes de imagen con el contexto actual o con `contexto` (el del escaneo)"""
+        h = hashlib.sha256(self.contexto if contexto is None else contexto.encode('utf-8'))
+        h.update(datos)
+        return h.hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave + '.json')
+
+    def get(self, clave):
+        """Devuelve (registro, nivel) o (None, None)"""
+        with self.lock:
+            if clave in self.memoria:
+                self.memoria.move_to_end(clave)
+                self.aciertos["memoria"] += 1
+                return json.loads(self.memoria[clave]), "memoria"
+
+        if self.directorio:
+            ruta = self._ruta(clave)
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    texto = f.read()
+                registro = json.loads(texto)
+                # Se actualiza la fecha para que el desalojo sea por último uso
+                os.utime(ruta)
+            except (OSError, ValueError):
+                registro = None
+            if registro is not None:
+                with self.lock:
+                    self._guardar_memoria(clave, texto)
+                    self.aciertos["disco"] += 1
+                return registro, "disco"
+
+        with self.lock:
+            self.aciertos["fallos"] += 1
+        return None, None
+
+    def put(self, clave, registro):
+        texto = json.dumps(registro, ensure_ascii=False)
+        with self.lock:
+            self._guardar_memoria(clave, texto)
+        if not self.directorio:
+            return
+        datos = texto.encode('utf-8')
+        ruta = self._ruta(clave)
+        # pid e hilo: la carpeta se comparte entre procesos (scan_pool.py --cache-dir)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(datos)
+        try:
+            anterior = os.path.getsize(ruta)
+        except OSError:
+            anterior = 0
+        os.replace(temporal, ruta)
+        with self.lock:
+            self.bytes_disco += len(datos) - anterior
+            self.escritos += len(datos)
+            if self.escritos > self.max_disco * 0.1:
+                self.bytes_disco = self._medir_disco()
+            if self.bytes_disco > self.max_disco:
+                self._desalojar_disco()
+
+    def _medir_disco(self):
+        """Bytes de todas las entradas de la carpeta, también las escritas por otros procesos"""
+        self.escritos = 0
+        total = 0
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith('.json'):
+                try:
+                    total += os.path.getsize(os.path.join(self.directorio, nombre))
+                except OSError:
+                    pass  # otro proceso la acaba de desalojar
+        return total
+
+    def _guardar_memoria(self, clave, registro):
+        self.memoria[clave] = registro
+        self.memoria.move_to_end(clave)
+        while len(self.memoria) > self.max_memoria:
+            self.memoria.popitem(last=False)
+
+    def _desalojar_disco(self):
+        """Borra las entradas usadas hace más tiempo hasta quedar en el 80% del límite"""
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith('.json'):
+                ruta = os.path.join(self.directorio, nombre)
+                try:
+                    st = os.stat(ruta)
+                except OSError:
+                    continue
+                entradas.append((st.st_mtime, st.st_size, ruta))
+        entradas.sort()
+        total = sum(size for _, size, _ in entradas)
+        for _, size, ruta in entradas:
+            if total <= self.max_disco * 0.8:
+                break
+            try:
+                os.remove(ruta)
+                total -= size
+            except OSError:
+                pass
+        self.bytes_disco = total
+        self.escritos = 0
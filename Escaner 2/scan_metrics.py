@@ -0,0 +1,142 @@
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+CUBETAS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# nombre -> (tipo, ayuda, cubetas)
+DEFINICIONES = {
+    'scanner_escaneos_total': ('counter', "Imágenes escaneadas", None),
+    'scanner_etapa_ms': ('histogram', "Milisegundos por etapa del escaneo", CUBETAS_MS),
+    'scanner_cajas_por_imagen': ('histogram', "Cajas de texto detectadas por YOLO en cada imagen",
+                                 (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)),
+    'scanner_llamadas_ocr_total': ('counter', "Llamadas a easyocr (recognize o readtext)", None),
+    'scanner_candidatos_evaluados': ('histogram', "Candidatos puntuados por cada búsqueda en el catálogo",
+                                     (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)),
+    'scanner_cache_total': ('counter', "Consultas a la caché de resultados por resultado", None),
+    'scanner_recargas_catalogo_total': ('counter', "Recargas en caliente del catálogo", None),
+}
+
+def _etiquetas(etiquetas):
+    return tuple(sorted(etiquetas.items()))
+
+def _formato_etiquetas(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    texto = ','.join(f'{k}="{str(v)}"' for k, v in pares)
+    return '{' + texto + '}'
+
+class Metricas:
+    """Contadores e histogramas acumulados en memoria, exportables en formato de texto de Prometheus.
+
+    Cada observación es una suma bajo un lock (sin asignar memoria salvo la
+    primera vez que aparece una combinación de etiquetas), así que se puede
+    dejar activo en producción.
+    """
+
+    def __init__(self, definiciones=DEFINICIONES):
+        self.definiciones = definiciones
+        self.lock = threading.Lock()
+        self.contadores = defaultdict(float)
+        # (nombre, etiquetas) -> [conteos por cubeta (+Inf al final), suma, n]
+        self.histogramas = {}
+
+    def contar(self, nombre, n=1, **etiquetas):
+        with self.lock:
+            self.contadores[(nombre, _etiquetas(etiquetas))] += n
+
+    def observar(self, nombre, valor, **etiquetas):
+        cubetas = self.definiciones[nombre][2]
+        clave = (nombre, _etiquetas(etiquetas))
+        with self.lock:
+            hist = self.histogramas.get(clave)
+            if hist is None:
+                hist = self.histogramas[clave] = [[0] * (len(cubetas) + 1), 0.0, 0]
+            hist[0][bisect.bisect_left(cubetas, valor)] += 1
+            hist[1] += valor
+            hist[2] += 1
+
+    def prometheus(self):
+        """Texto para un endpoint /metrics o para el textfile collector de node_exporter"""
+        with self.lock:
+            contadores = dict(self.contadores)
+            histogramas = {k: ([*v[0]], v[1], v[2]) for k, v in self.histogramas.items()}
+
+        lineas = []
+        for nombre, (tipo, ayuda, cubetas) in self.definiciones.items():
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            if tipo == 'counter':
+                for (n, etiquetas), valor in sorted(contadores.items()):
+                    if n == nombre:
+                        lineas.append(f"{nombre}{_formato_etiquetas(etiquetas)} {valor:g}")
+                continue
+            for (n, etiquetas), (conteos, suma, total) in sorted(histogramas.items()):
+                if n != nombre:
+                    continue
+                acumulado = 0
+                for limite, conteo in zip(list(cubetas) + ['+Inf'], conteos):
+                    acumulado += conteo
+                    lineas.append(f"{nombre}_bucket{_formato_etiquetas(etiquetas, [('le', limite)])} {acumulado}")
+                lineas.append(f"{nombre}_sum{_formato_etiquetas(etiquetas)} {suma:g}")
+                lineas.append(f"{nombre}_count{_formato_etiquetas(etiquetas)} {total}")
+        return "\n".join(lineas) + "\n"
+
+    def guardar_prometheus(self, path):
+        temporal = f"{path}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(temporal, path)
+
+class Cronometro:
+    """Acumula los milisegundos que pasa cada etapa del escaneo.
+
+    Con `metricas`, observar() pasa el total de cada etapa al histograma
+    scanner_etapa_ms una vez por escaneo (una etapa puede medirse en varios tramos);
+    con traza=True se guardan los intervalos para exportarlos como traza de Chrome
+    (chrome://tracing o https://ui.perfetto.dev).
+    """
+
+    def __init__(self, metricas=None, traza=False):
+        self.tiempos = defaultdict(float)
+        self.metricas = metricas
+        self.eventos = [] if traza else None
+
+    @contextmanager
+    def etapa(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar(nombre, (time.perf_counter() - inicio) * 1000, inicio)
+
+    def sumar(self, nombre, ms, inicio=None):
+        """Añade `ms` a una etapa medida fuera de etapa() (p. ej. la parte de un lote de YOLO)"""
+        self.tiempos[nombre] += ms
+        if self.eventos is not None and inicio is not None:
+            self.eventos.append({
+                "name": nombre,
+                "ph": "X",
+                "ts": round(inicio * 1e6, 1),
+                "dur": round(ms * 1000, 1),
+                "pid": os.getpid(),
+                "tid": threading.get_ident()
+            })
+
+    def observar(self):
+        """Observa en scanner_etapa_ms los milisegundos acumulados de cada etapa"""
+        if self.metricas is None:
+            return
+        for etapa, ms in self.tiempos.items():
+            if etapa != 'total':
+                self.metricas.observar('scanner_etapa_ms', ms, etapa=etapa)
+
+    def como_dict(self):
+        return {etapa: round(ms, 2) for etapa, ms in self.tiempos.items()}
+
+    def traza(self):
+        return {"traceEvents": list(self.eventos or []), "displayTimeUnit": "ms"}
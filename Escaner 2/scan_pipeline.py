@@ -0,0 +1,270 @@
+import argparse
+import functools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from card_scanner import CardScanner, expandir_fuentes, imprimir_resultados, registro_vacio, silencio
+
+_FIN = object()
+
+class PipelineEscaner:
+    """Escaneo masivo en etapas solapadas: decode -> detect -> ocr -> match.
+
+    Cada etapa tiene sus propios hilos y se comunica con la siguiente por una
+    cola acotada (max_cola), así que mientras una imagen está en OCR las
+    siguientes ya se están decodificando y pasando por YOLO. OpenCV, PyTorch y
+    easyocr liberan el GIL en sus operaciones pesadas, por lo que el
+    rendimiento total tiende al de la etapa más lenta.
+
+    YOLO se ejecuta siempre en un único hilo que agrupa en lotes de hasta
+    batch_size las imágenes que ya estén esperando. Con más de un hilo de OCR
+    cada uno crea su propio lector easyocr (no admiten llamadas simultáneas).
+    """
+
+    def __init__(self, scanner, workers_decode=2, workers_ocr=1, workers_match=1, batch_size=4, max_cola=8):
+        self.scanner = scanner
+        self.workers = {
+            'decode': max(1, workers_decode),
+            'detect': 1,
+            'ocr': max(1, workers_ocr),
+            'match': max(1, workers_match)
+        }
+        self.batch_size = max(1, batch_size)
+        self.max_cola = max(1, max_cola)
+        self.lectores = [None] + [scanner.nuevo_lector() for _ in range(self.workers['ocr'] - 1)]
+        self.ocupado = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def _poner(self, cola, item):
+        """put que se rinde si el consumidor abandonó el escaneo"""
+        while not self.detener.is_set():
+            try:
+                cola.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _tomar(self, cola):
+        """get que devuelve _FIN si el consumidor abandonó el escaneo"""
+        while not self.detener.is_set():
+            try:
+                return cola.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _FIN
+
+    def _medir(self, etapa, inicio):
+        with self.lock:
+            self.ocupado[etapa] += time.perf_counter() - inicio
+
+    def _terminar(self, etapa, salida, siguientes):
+        """El último hilo de una etapa en terminar avisa a todos los hilos de la siguiente"""
+        with self.lock:
+            self.vivos[etapa] -= 1
+            ultimo = self.vivos[etapa] == 0
+        if ultimo:
+            for _ in range(siguientes):
+                self._poner(salida, _FIN)
+
+    def _error(self, source, error):
+        self.scanner.log(f"❌ Error al escanear {source}: {error}")
+        self._poner(self.resultados, (source, registro_vacio(source, str(error))))
+
+    def _decode(self, entrada, salida):
+        while True:
+            item = self._tomar(entrada)
+            if item is _FIN:
+                break
+            inicio = time.perf_counter()
+            crono = self.scanner.nuevo_cronometro()
+            # Todas las etapas de esta imagen usan el catálogo de ahora aunque se recargue
+            catalogo = self.scanner.catalogo
+            try:
+                image, clave, registro = self.scanner.preparar(item, crono, catalogo)
+            except Exception as e:
+                self._error(item, e)
+                continue
+            finally:
+                self._medir('decode', inicio)
+            if registro:
+                self._poner(self.resultados, (item, registro))
+            else:
+                self._poner(salida, (item, image, clave, crono, catalogo))
+        self._terminar('decode', salida, self.workers['detect'])
+
+    def _detect(self, entrada, salida):
+        fin = False
+        while not fin:
+            item = self._tomar(entrada)
+            if item is _FIN:
+                break
+            # Se agrupan las imágenes que ya estén esperando, sin bloquear por completar el lote
+            lote = [item]
+            while len(lote) < self.batch_size:
+                try:
+                    item = entrada.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _FIN:
+                    fin = True
+                    break
+                lote.append(item)
+
+            inicio = time.perf_counter()
+            try:
+                resultados = self.scanner.detectar([image for _, image, _, _, _ in lote])
+            except Exception as e:
+                for source, _, _, _, _ in lote:
+                    self._error(source, e)
+                continue
+            finally:
+                self._medir('detect', inicio)
+            # La inferencia es conjunta: se reparte su duración entre las imágenes del lote
+            detect_ms = (time.perf_counter() - inicio) * 1000 / len(lote)
+            for (source, image, clave, crono, catalogo), results in zip(lote, resultados):
+                crono.sumar('detect', detect_ms, inicio)
+                self._poner(salida, (source, image, clave, crono, catalogo, results))
+        self._terminar('detect', salida, self.workers['ocr'])
+
+    def _ocr(self, entrada, salida, reader):
+        while True:
+            item = self._tomar(entrada)
+            if item is _FIN:
+                break
+            source, image, clave, crono, catalogo, results = item
+            inicio = time.perf_counter()
+            try:
+                cajas, full_text = self.scanner.leer(image, results, crono, reader=reader)
+            except Exception as e:
+                self._error(source, e)
+                continue
+            finally:
+                self._medir('ocr', inicio)
+            self._poner(salida, (source, image, clave, crono, catalogo, cajas, full_text))
+        self._terminar('ocr', salida, self.workers['match'])
+
+    def _match(self, entrada):
+        while True:
+            item = self._tomar(entrada)
+            if item is _FIN:
+                break
+            source, image, clave, crono, catalogo, cajas, full_text = item
+            inicio = time.perf_counter()
+            try:
+                registro = self.scanner.resolver(image, cajas, full_text, crono, source=source, catalogo=catalogo)
+                self.scanner.guardar_en_cache(clave, registro)
+            except Exception as e:
+                self._error(source, e)
+                continue
+            finally:
+                self._medir('match', inicio)
+            self._poner(self.resultados, (source, registro))
+
+    def _alimentar(self, sources, salida):
+        for source in sources:
+            self._poner(salida, source)
+        for _ in range(self.workers['decode']):
+            self._poner(salida, _FIN)
+
+    def escanear(self, sources):
+        """Entrega (fuente, registro) en el orden en que cada imagen termina"""
+        sources = list(sources)
+        if not sources:
+            return
+        self.detener = threading.Event()
+        self.vivos = dict(self.workers)
+        self.ocupado.clear()
+        self.resultados = queue.Queue()
+        colas = [queue.Queue(maxsize=self.max_cola) for _ in range(4)]
+        entrada, a_detect, a_ocr, a_match = colas
+
+        hilos = [threading.Thread(target=self._alimentar, args=(sources, entrada))]
+        hilos += [threading.Thread(target=self._decode, args=(entrada, a_detect)) for _ in range(self.workers['decode'])]
+        hilos += [threading.Thread(target=self._detect, args=(a_detect, a_ocr))]
+        hilos += [threading.Thread(target=self._ocr, args=(a_ocr, a_match, reader)) for reader in self.lectores]
+        hilos += [threading.Thread(target=self._match, args=(a_match,)) for _ in range(self.workers['match'])]
+        for hilo in hilos:
+            hilo.daemon = True
+            hilo.start()
+
+        inicio = time.perf_counter()
+        try:
+            for _ in range(len(sources)):
+                yield self.resultados.get()
+        finally:
+            self.detener.set()
+            for hilo in hilos:
+                hilo.join()
+        self.informe(len(sources), time.perf_counter() - inicio)
+
+    def informe(self, n, segundos):
+        """Rendimiento total frente al tiempo de trabajo de cada etapa repartido entre sus hilos"""
+        self.scanner.log(f"⏱️ {n} imágenes en {segundos:.1f} s ({n / segundos if segundos else 0:.2f} img/s)")
+        for etapa, workers in self.workers.items():
+            por_hilo = self.ocupado[etapa] / workers
+            self.scanner.log(f"   {etapa:<7} {workers} hilo(s): {por_hilo:.1f} s de trabajo por hilo "
+                             f"({100 * por_hilo / segundos if segundos else 0:.0f}% del total)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escaneo masivo de cartas con etapas en paralelo")
+    parser.add_argument('--source', required=True, help="Carpeta, patrón glob o archivo .txt con rutas")
+    parser.add_argument('--weights', required=True, help="Ruta al modelo entrenado (.pt, .onnx o carpeta *_openvino_model)")
+    parser.add_argument('--json', required=True, help="Ruta al archivo JSON de cartas")
+    parser.add_argument('--batch-size', type=int, default=4, help="Máximo de imágenes por lote de YOLO")
+    parser.add_argument('--workers-decode', type=int, default=2, help="Hilos de lectura y decodificación")
+    parser.add_argument('--workers-ocr', type=int, default=1, help="Hilos de OCR (cada uno carga su lector easyocr)")
+    parser.add_argument('--workers-match', type=int, default=1, help="Hilos de búsqueda en el catálogo")
+    parser.add_argument('--max-cola', type=int, default=8, help="Tamaño máximo de cada cola entre etapas")
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text',
+                        help="text: salida legible; jsonl: un registro JSON por imagen en stdout")
+    parser.add_argument('--quiet', action='store_true', help="No escribir mensajes de progreso")
+    parser.add_argument('--hashes', help="JSON de hashes perceptuales de referencia para identificar sin OCR")
+    parser.add_argument('--cache-dir', help="Carpeta para la caché en disco de resultados")
+    parser.add_argument('--layout', action='store_true', help="Leer nombre y código en sus posiciones fijas antes de YOLO")
+
+    args = parser.parse_args()
+
+    sources = expandir_fuentes(args.source)
+    if not sources or (len(sources) == 1 and not os.path.exists(sources[0])):
+        print(f"❌ Error: La imagen no existe: {args.source}", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.exists(args.weights):
+        print(f"❌ Error: El modelo no existe: {args.weights}", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.exists(args.json):
+        print(f"❌ Error: El archivo JSON no existe: {args.json}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.quiet:
+        log = silencio
+    elif args.format == 'jsonl':
+        log = functools.partial(print, file=sys.stderr)
+    else:
+        log = print
+
+    scanner = CardScanner(args.weights, args.json, hashes_path=args.hashes, cache_dir=args.cache_dir,
+                          layout_fijo=args.layout, log=log)
+    scanner.calentar()
+    pipeline = PipelineEscaner(
+        scanner,
+        workers_decode=args.workers_decode,
+        workers_ocr=args.workers_ocr,
+        workers_match=args.workers_match,
+        batch_size=args.batch_size,
+        max_cola=args.max_cola
+    )
+    log(f"📂 {len(sources)} imágenes a escanear")
+    for source, registro in pipeline.escanear(sources):
+        if args.format == 'jsonl':
+            sys.stdout.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+        elif not args.quiet:
+            print(f"\n📸 {source}")
+            imprimir_resultados(registro)
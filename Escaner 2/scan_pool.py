@@ -0,0 +1,161 @@
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from card_catalog import cargar_catalogo
+from card_scanner import CardScanner, expandir_fuentes, imprimir_resultados, silencio
+
+# Escáner propio de cada proceso: se crea una sola vez en el inicializador del pool
+_scanner = None
+_batch_size = 8
+
+VARIABLES_HILOS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+@contextmanager
+def limitar_hilos(hilos):
+    """Variables de entorno de hilos para los procesos que se creen dentro del bloque.
+
+    Tienen que estar definidas antes de que el proceso hijo importe torch/numpy,
+    por eso se fijan en el padre justo al crear el pool y luego se restauran.
+    """
+    anteriores = {var: os.environ.get(var) for var in VARIABLES_HILOS}
+    os.environ.update({var: str(hilos) for var in VARIABLES_HILOS})
+    try:
+        yield
+    finally:
+        for var, valor in anteriores.items():
+            if valor is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = valor
+
+def _iniciar_worker(weights_path, json_path, hilos, hashes_path=None, cache_dir=None, batch_size=8, layout_fijo=False):
+    """Inicializador del pool: fija los hilos intra-op y carga YOLO, easyocr y el catálogo una vez"""
+    global _scanner, _batch_size
+    import cv2
+    cv2.setNumThreads(hilos)
+    try:
+        import torch
+        torch.set_num_threads(hilos)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+    _batch_size = batch_size
+    _scanner = CardScanner(weights_path, json_path, hashes_path=hashes_path, cache_dir=cache_dir,
+                           layout_fijo=layout_fijo, log=silencio)
+    _scanner.calentar()
+
+def _escanear_fragmento(sources):
+    """Escanea un fragmento del trabajo en el proceso actual y devuelve [(fuente, registro)]"""
+    return list(_scanner.escanear_lote(sources, batch_size=_batch_size))
+
+def fragmentos(sources, tam):
+    return [sources[i:i + tam] for i in range(0, len(sources), tam)]
+
+def escanear_en_pool(sources, weights_path, json_path, workers=None, hilos=None, fragmento=None,
+                     hashes_path=None, cache_dir=None, batch_size=8, layout_fijo=False, log=print):
+    """Reparte las imágenes entre `workers` procesos y va entregando (fuente, registro) según terminan.
+
+    Por defecto cada proceso usa cpu_count // workers hilos intra-op para no
+    sobresuscribir la máquina. Los fragmentos son pequeños (unas pocas veces
+    batch_size) para que los procesos rápidos no se queden esperando al final.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    hilos = max(1, hilos or (os.cpu_count() or 1) // workers)
+    fragmento = fragmento or max(1, min(batch_size * 2, -(-len(sources) // (workers * 4))))
+
+    # Se compila el catálogo en el padre para que los procesos solo carguen el artefacto
+    cargar_catalogo(json_path, log=log)
+    log(f"🧵 {workers} proceso(s) x {hilos} hilo(s), fragmentos de {fragmento} imágenes")
+    # spawn: los hijos no heredan el estado de torch/easyocr del padre ni sus hilos
+    contexto = multiprocessing.get_context('spawn')
+    with limitar_hilos(hilos):
+        pool = contexto.Pool(
+            workers,
+            initializer=_iniciar_worker,
+            initargs=(weights_path, json_path, hilos, hashes_path, cache_dir, batch_size, layout_fijo)
+        )
+    with pool:
+        for resultados in pool.imap_unordered(_escanear_fragmento, fragmentos(sources, fragmento)):
+            yield from resultados
+
+def medir_rendimiento(sources, weights_path, json_path, lista_workers, **kwargs):
+    """Escanea el mismo lote con cada número de procesos y muestra las imágenes por segundo"""
+    filas = []
+    for workers in lista_workers:
+        inicio = time.perf_counter()
+        n = sum(1 for _ in escanear_en_pool(sources, weights_path, json_path, workers=workers, log=silencio, **kwargs))
+        segundos = time.perf_counter() - inicio
+        filas.append((workers, segundos, n / segundos if segundos else 0.0))
+        print(f"⏱️ {workers} proceso(s): {n} imágenes en {segundos:.1f} s ({filas[-1][2]:.2f} img/s)", file=sys.stderr)
+
+    base = filas[0][2]
+    print("\n📊 Rendimiento por número de procesos (incluye la carga de modelos de cada proceso):")
+    print(f"{'procesos':>9}{'segundos':>10}{'img/s':>9}{'speedup':>9}")
+    for workers, segundos, ips in filas:
+        print(f"{workers:>9}{segundos:>10.1f}{ips:>9.2f}{ips / base if base else 0:>8.2f}x")
+    return filas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escaneo masivo de cartas con varios procesos")
+    parser.add_argument('--source', required=True, help="Carpeta, patrón glob o archivo .txt con rutas")
+    parser.add_argument('--weights', required=True, help="Ruta al modelo entrenado (.pt, .onnx o carpeta *_openvino_model)")
+    parser.add_argument('--json', required=True, help="Ruta al archivo JSON de cartas")
+    parser.add_argument('--workers', default=None,
+                        help="Número de procesos (por defecto uno por núcleo); una lista como 1,2,4 mide el rendimiento de cada uno")
+    parser.add_argument('--hilos', type=int, help="Hilos intra-op por proceso (por defecto núcleos / procesos)")
+    parser.add_argument('--fragmento', type=int, help="Imágenes por tarea enviada a cada proceso")
+    parser.add_argument('--batch-size', type=int, default=8, help="Imágenes por lote de YOLO dentro de cada proceso")
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text',
+                        help="text: salida legible; jsonl: un registro JSON por imagen en stdout")
+    parser.add_argument('--quiet', action='store_true', help="No escribir mensajes de progreso")
+    parser.add_argument('--hashes', help="JSON de hashes perceptuales de referencia para identificar sin OCR")
+    parser.add_argument('--cache-dir', help="Carpeta para la caché en disco de resultados (compartida entre procesos)")
+    parser.add_argument('--layout', action='store_true', help="Leer nombre y código en sus posiciones fijas antes de YOLO")
+
+    args = parser.parse_args()
+
+    sources = expandir_fuentes(args.source)
+    if not sources or (len(sources) == 1 and not os.path.exists(sources[0])):
+        print(f"❌ Error: La imagen no existe: {args.source}", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.exists(args.weights):
+        print(f"❌ Error: El modelo no existe: {args.weights}", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.exists(args.json):
+        print(f"❌ Error: El archivo JSON no existe: {args.json}", file=sys.stderr)
+        sys.exit(1)
+
+    lista_workers = [int(w) for w in args.workers.split(',')] if args.workers else [None]
+    opciones = dict(hilos=args.hilos, fragmento=args.fragmento, hashes_path=args.hashes,
+                    cache_dir=args.cache_dir, batch_size=max(1, args.batch_size), layout_fijo=args.layout)
+
+    if len(lista_workers) > 1:
+        medir_rendimiento(sources, args.weights, args.json, lista_workers, **opciones)
+        sys.exit(0)
+
+    if args.quiet:
+        log = silencio
+    elif args.format == 'jsonl':
+        log = functools.partial(print, file=sys.stderr)
+    else:
+        log = print
+
+    inicio = time.perf_counter()
+    for source, registro in escanear_en_pool(sources, args.weights, args.json, workers=lista_workers[0], log=log,
+                                             **opciones):
+        if args.format == 'jsonl':
+            sys.stdout.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+        elif not args.quiet:
+            print(f"\n📸 {source}")
+            imprimir_resultados(registro)
+    segundos = time.perf_counter() - inicio
+    log(f"⏱️ {len(sources)} imágenes en {segundos:.1f} s ({len(sources) / segundos if segundos else 0:.2f} img/s)")
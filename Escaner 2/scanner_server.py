@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from card_scanner import CardScanner, silencio
+
+# Tamaño máximo del cuerpo de una petición (una foto de móvil sin comprimir cabe de sobra)
+MAX_CUERPO_MB = 32
+
+class ScannerHandler(BaseHTTPRequestHandler):
+    """API HTTP local del escáner residente.
+
+    GET  /health -> estado del servicio y versión del catálogo cargado
+    GET  /metrics -> métricas del escáner en formato de texto de Prometheus
+    POST /scan   -> cuerpo JSON {"source": "ruta/a/imagen.png"} o los bytes de la imagen (Content-Type image/*)
+    """
+    scanner = None
+    quiet = False
+    lock = threading.Lock()
+
+    def _responder(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            catalogo = self.scanner.catalogo
+            self._responder(200, {"status": "ok", "catalogo": catalogo.version, "cartas": len(catalogo.cartas)})
+        elif self.path == '/metrics':
+            body = self.scanner.metricas.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._responder(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        if self.path != '/scan':
+            self._responder(404, {"error": "Ruta no encontrada"})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._responder(400, {"error": "Content-Length inválido"})
+            return
+        if length > MAX_CUERPO_MB * 1024 * 1024:
+            self._responder(413, {"error": f"Cuerpo demasiado grande (máximo {MAX_CUERPO_MB} MB)"})
+            return
+        body = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+
+        if content_type.startswith('image/') or content_type == 'application/octet-stream':
+            if not body:
+                self._responder(400, {"error": "Imagen vacía"})
+                return
+            source = body
+        else:
+            try:
+                peticion = json.loads(body or b'{}')
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                self._responder(400, {"error": "JSON inválido"})
+                return
+            source = peticion.get('source') if isinstance(peticion, dict) else None
+            if not isinstance(source, str) or not os.path.exists(source):
+                self._responder(400, {"error": f"La imagen no existe: {source}"})
+                return
+
+        inicio = time.perf_counter()
+        try:
+            # YOLO y easyocr no son seguros entre hilos: se atiende un escaneo a la vez
+            with self.lock:
+                registro = self.scanner.escanear(source)
+        except Exception as e:
+            self.log_error("Error al escanear: %r", e)
+            self._responder(500, {"error": f"Error al escanear: {e}"})
+            return
+        registro["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        self._responder(400 if registro.get("error") else 200, registro)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def run_server(weights_path, json_path, host='127.0.0.1', port=8765, quiet=False, hashes_path=None, cache_dir=None,
+               modelos_dir=None, intervalo_recarga=2.0):
+    print("⏳ Cargando modelos y catálogo...")
+    ScannerHandler.quiet = quiet
+    ScannerHandler.scanner = CardScanner(
+        weights_path, json_path, hashes_path=hashes_path, cache_dir=cache_dir, usar_cache=True,
+        modelos_dir=modelos_dir, recargar=intervalo_recarga > 0, intervalo_recarga=intervalo_recarga,
+        log=silencio if quiet else print
+    )
+    ScannerHandler.scanner.calentar()
+
+    server = ThreadingHTTPServer((host, port), ScannerHandler)
+    print(f"🚀 Escáner escuchando en http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Deteniendo escáner")
+    finally:
+        server.server_close()
+        ScannerHandler.scanner.parar_recarga()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio residente del escáner de cartas")
+    parser.add_argument('--weights', help="Ruta al modelo entrenado (.pt, .onnx o carpeta *_openvino_model); "
+                                          "por defecto el del bundle de --modelos")
+    parser.add_argument('--json', required=True, help="Ruta al archivo JSON de cartas")
+    parser.add_argument('--host', default='127.0.0.1', help="Dirección de escucha")
+    parser.add_argument('--port', type=int, default=8765, help="Puerto de escucha")
+    parser.add_argument('--quiet', action='store_true', help="No escribir el progreso de cada escaneo")
+    parser.add_argument('--hashes', help="JSON de hashes perceptuales de referencia para identificar sin OCR")
+    parser.add_argument('--cache-dir', help="Carpeta para la caché en disco (la caché en memoria siempre está activa)")
+    parser.add_argument('--modelos', help="Bundle local de modelos (model_bundle.py) para funcionar sin red")
+    parser.add_argument('--recarga', type=float, default=2.0,
+                        help="Segundos entre comprobaciones de cambios en el catálogo (0 desactiva la recarga en caliente)")
+
+    args = parser.parse_args()
+
+    if args.modelos and not args.weights:
+        from model_bundle import pesos_bundle
+        args.weights = pesos_bundle(args.modelos)
+
+    if not args.weights:
+        print("❌ Error: Indica --weights o un bundle de --modelos que incluya los pesos")
+        sys.exit(1)
+
+    if not os.path.exists(args.weights):
+        print(f"❌ Error: El modelo no existe: {args.weights}")
+        sys.exit(1)
+
+    if not os.path.exists(args.json):
+        print(f"❌ Error: El archivo JSON no existe: {args.json}")
+        sys.exit(1)
+
+    run_server(args.weights, args.json, args.host, args.port, quiet=args.quiet, hashes_path=args.hashes,
+               cache_dir=args.cache_dir, modelos_dir=args.modelos, intervalo_recarga=args.recarga)
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from card_catalog import VigilanteCatalogo, cargar_catalogo
+
+CATALOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Cartas.Collection3.json')
+
+def sin_log(*args, **kwargs):
+    pass
+
+class YOLOFalso:
+    """Detector que siempre devuelve una caja card_code"""
+    names = {5: 'card_code'}
+
+    def __init__(self, weights_path, task=None):
+        pass
+
+    def __call__(self, images, conf=0.1, verbose=False):
+        caja = types.SimpleNamespace(xyxy=[np.array([10, 10, 90, 30])], conf=[0.9], cls=[5])
+        return [types.SimpleNamespace(boxes=[caja]) for _ in images]
+
+class LectorFalso:
+    """Reconocedor que lee el mismo código en cada fila del mosaico"""
+    texto = 'OOF-10'
+
+    def __init__(self, idiomas, **kwargs):
+        pass
+
+    def recognize(self, lienzo, horizontal_list=None, **kwargs):
+        return [([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], self.texto, 0.9) for x1, x2, y1, y2 in horizontal_list]
+
+@pytest.fixture
+def modelos_falsos(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'ultralytics', types.SimpleNamespace(YOLO=YOLOFalso))
+    monkeypatch.setitem(sys.modules, 'easyocr', types.SimpleNamespace(Reader=LectorFalso))
+
+@pytest.fixture
+def rutas(tmp_path):
+    """Copia del catálogo (su artefacto se compila en tmp_path) y unos pesos de mentira"""
+    json_path = tmp_path / 'cartas.json'
+    shutil.copy(CATALOGO, json_path)
+    weights = tmp_path / 'modelo.pt'
+    weights.write_bytes(b'pesos')
+    return str(json_path), str(weights)
+
+def renombrar(json_path, code, nombre):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        cartas = json.load(f)
+    for carta in cartas:
+        if carta.get('code') == code:
+            carta['name'] = nombre
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(cartas, f)
+    # Firma distinta aunque el sistema de archivos tenga mtime de grano grueso
+    mtime = os.path.getmtime(json_path) + 10
+    os.utime(json_path, (mtime, mtime))
+
+def imagen():
+    return np.full((100, 100, 3), 255, dtype=np.uint8)
+
+def test_vigilante_espera_dos_comprobaciones_iguales(rutas):
+    json_path, _ = rutas
+    recibidos = []
+    vigilante = VigilanteCatalogo(json_path, recibidos.append, firmas=cargar_catalogo(json_path, log=sin_log).firmas,
+                                  log=sin_log)
+    assert vigilante.revisar() is None
+    renombrar(json_path, 'OOF-10', 'assault renamed')
+    assert vigilante.revisar() is None
+    catalogo = vigilante.revisar()
+    assert recibidos == [catalogo]
+    assert catalogo.buscar_codigo('OOF-10')['name'] == 'assault renamed'
+    assert vigilante.revisar() is None
+
+def test_recarga_sustituye_el_catalogo_del_escaner(modelos_falsos, rutas):
+    from card_scanner import CardScanner
+    json_path, weights = rutas
+    scanner = CardScanner(weights, json_path, usar_cache=True, log=sin_log)
+    assert scanner.escanear(imagen())["cartas"][0]["name"] == 'disrupted assault'
+    assert scanner.escanear(imagen())["cache"] == 'memoria'
+
+    version = scanner.catalogo.version
+    vigilante = VigilanteCatalogo(json_path, scanner.cambiar_catalogo, firmas=scanner.catalogo.firmas, log=sin_log)
+    renombrar(json_path, 'OOF-10', 'assault renamed')
+    vigilante.revisar()
+    vigilante.revisar()
+
+    assert scanner.catalogo.version != version
+    registro = scanner.escanear(imagen())
+    assert "cache" not in registro
+    assert registro["cartas"][0]["name"] == 'assault renamed'
+    assert 'scanner_recargas_catalogo_total 1' in scanner.metricas.prometheus()
+
+def test_escaneo_en_curso_termina_con_su_catalogo(modelos_falsos, rutas):
+    from card_scanner import CardScanner
+    json_path, weights = rutas
+    scanner = CardScanner(weights, json_path, usar_cache=True, log=sin_log)
+    anterior = scanner.catalogo
+    renombrar(json_path, 'OOF-10', 'assault renamed')
+    nuevo = cargar_catalogo(json_path, log=sin_log)
+
+    detectar = scanner.detectar
+
+    def detectar_y_recargar(images):
+        scanner.cambiar_catalogo(nuevo)
+        return detectar(images)
+
+    scanner.detectar = detectar_y_recargar
+    assert scanner.escanear(imagen())["cartas"][0]["name"] == 'disrupted assault'
+    scanner.detectar = detectar
+
+    # El resultado quedó guardado con la versión del catálogo anterior: no se sirve con el nuevo
+    registro = scanner.escanear(imagen())
+    assert "cache" not in registro
+    assert registro["cartas"][0]["name"] == 'assault renamed'
+    assert scanner.cache.clave(b'x', scanner.contexto_cache(anterior)) != scanner.cache.clave(b'x')
@@ -0,0 +1,99 @@
+import json
+import os
+import random
+
+import numpy as np
+
+from card_index import AutomataKeywords, CorrectorOCR, IndiceKeywords, VocabularioVectorial, distancia_edicion
+
+CATALOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Cartas.Collection3.json')
+
+def cartas_catalogo():
+    with open(CATALOGO, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def lcs_referencia(a, b):
+    """LCS con la programación dinámica de libro, celda a celda"""
+    tabla = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, ca in enumerate(a, 1):
+        for j, cb in enumerate(b, 1):
+            tabla[i][j] = tabla[i - 1][j - 1] + 1 if ca == cb else max(tabla[i - 1][j], tabla[i][j - 1])
+    return tabla[-1][-1]
+
+def palabras_aleatorias(rng, n, alfabeto='abcdeñé', largo_max=12):
+    return [''.join(rng.choice(alfabeto) for _ in range(rng.randint(0, largo_max))) for _ in range(n)]
+
+def test_lcs_coincide_con_la_referencia():
+    rng = random.Random(0)
+    vocabulario = VocabularioVectorial(palabras_aleatorias(rng, 200))
+    for palabra in palabras_aleatorias(rng, 50):
+        esperado = [lcs_referencia(palabra, p) for p in vocabulario.palabras]
+        assert vocabulario.lcs(palabra).tolist() == esperado
+
+def test_lcs_con_ids_solo_puntua_esas_filas():
+    rng = random.Random(1)
+    vocabulario = VocabularioVectorial(palabras_aleatorias(rng, 50))
+    ids = np.array([3, 0, 41, 41, 17])
+    palabra = 'abcabc'
+    assert vocabulario.lcs(palabra, ids).tolist() == [lcs_referencia(palabra, vocabulario.palabras[i]) for i in ids]
+
+def test_similitudes_es_indel_normalizada():
+    vocabulario = VocabularioVectorial(['flameborn', 'hefest', ''])
+    sims = vocabulario.similitudes('flamebom')
+    assert sims[0] == 2 * 7 / (9 + 8)
+    assert sims[1] == 2 * 2 / (6 + 8)  # "fe"
+    assert sims[2] == 0.0
+    assert VocabularioVectorial(['']).similitudes('').tolist() == [0.0]
+
+def test_distancia_edicion_cuenta_trasposiciones():
+    assert distancia_edicion('flamebom', 'flameborn') == 2
+    assert distancia_edicion('hefset', 'hefest') == 1
+    assert distancia_edicion('', 'abc') == 3
+
+def test_corrector_arregla_el_nombre_leido():
+    corrector = CorrectorOCR(cartas_catalogo())
+    texto, correcciones = corrector.corregir('hefest the flamebom')
+    assert texto == 'hefest the flameborn'
+    assert correcciones == [('flamebom', 'flameborn')]
+
+def test_corrector_deja_palabras_cortas_y_desconocidas():
+    corrector = CorrectorOCR([{"name": "Truck", "keywords": ["draw"]}])
+    assert corrector.corregir('Trock drw xyzzyq') == ('truck drw xyzzyq', [('trock', 'truck')])
+
+def apariciones_ingenuas(texto, palabras):
+    """Todas las apariciones (también solapadas) buscando cada palabra con str.find"""
+    encontradas = []
+    for palabra, keyword in palabras.items():
+        inicio = texto.find(palabra)
+        while inicio != -1:
+            encontradas.append((inicio, inicio + len(palabra), keyword))
+            inicio = texto.find(palabra, inicio + 1)
+    return sorted(encontradas)
+
+def test_automata_coincide_con_la_busqueda_ingenua():
+    rng = random.Random(2)
+    for _ in range(100):
+        palabras = {p: p.upper() for p in palabras_aleatorias(rng, 8, alfabeto='abc', largo_max=4) if p}
+        texto = ''.join(rng.choice('abc ') for _ in range(60))
+        assert sorted(AutomataKeywords(palabras).buscar(texto)) == apariciones_ingenuas(texto, palabras)
+
+def test_automata_con_el_vocabulario_del_catalogo():
+    indice = IndiceKeywords(cartas_catalogo())
+    palabras = {kw: indice.canonica(kw) for kw in indice.palabras}
+    texto = 'recuit a ghost then push and draw 2 cards; breaks the vaquish shield'
+    assert sorted(indice.automata.buscar(texto)) == apariciones_ingenuas(texto, palabras)
+
+def test_alias_de_erratas_del_catalogo():
+    indice = IndiceKeywords(cartas_catalogo())
+    assert indice.alias == {'recuit': 'recruit', 'breaks': 'break', 'vaquish': 'vanquish'}
+    for variante, canonica in indice.alias.items():
+        assert variante not in indice.postings
+        assert indice.canonica(variante.upper()) == canonica
+    assert indice.encontrar('Recuit a ghost', log=lambda *a: None) == ['recruit', 'ghost']
+
+def test_alias_suma_las_cartas_de_la_variante():
+    cartas = [{"keywords": ["vanquish"]}, {"keywords": ["vanquish"]}, {"keywords": ["vaquish"]}, {"keywords": ["push"]}]
+    indice = IndiceKeywords(cartas)
+    assert indice.alias == {'vaquish': 'vanquish'}
+    assert indice.postings['vanquish'] == {0, 1, 2}
+    assert indice.buscar(['vaquish']) == [(0, 1), (1, 1), (2, 1)]
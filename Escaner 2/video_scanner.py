@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import cv2
+
+from card_scanner import CLASES_PRIORITARIAS, CardScanner, leer_codigo, silencio
+
+def iou(a, b):
+    """Intersección sobre unión de dos cajas (x1, y1, x2, y2)"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+class Pista:
+    """Una caja de texto seguida entre frames"""
+
+    def __init__(self, pista_id, clase, xyxy, frame):
+        self.id = pista_id
+        self.clase = clase
+        self.xyxy = xyxy
+        self.ultimo_frame = frame
+        self.lecturas = 0
+
+class VideoScanner:
+    """Escaneo en vídeo: YOLO cada `cada` frames, seguimiento de cajas por IoU y votación del OCR.
+
+    Mientras la carta sigue delante de la cámara sus cajas conservan la pista.
+    Una vez identificada solo se relee la caja del código cada `verificar_cada`
+    frames muestreados: si se cambia una carta por otra en el mismo sitio las
+    pistas continúan, pero el código leído deja de coincidir y se vuelve a
+    votar. Cuando todas las pistas se pierden durante `max_perdida` frames se
+    asume que la carta se retiró y se empieza a votar la siguiente.
+    """
+
+    def __init__(self, scanner, cada=5, iou_min=0.3, votos_min=3, max_perdida=30, lecturas_max=6, verificar_cada=3):
+        self.scanner = scanner
+        self.cada = max(1, cada)
+        self.iou_min = iou_min
+        self.votos_min = votos_min
+        self.max_perdida = max_perdida
+        self.lecturas_max = lecturas_max
+        self.pistas = []
+        self.siguiente_id = 0
+        self.verificar_cada = max(1, verificar_cada)
+        self.votos = Counter()
+        self.identificada = None
+        self.muestras_identificada = 0
+
+    def actualizar_pistas(self, cajas, frame_n):
+        """Asocia las cajas detectadas a pistas existentes (misma clase, mayor IoU) o crea pistas nuevas"""
+        libres = list(self.pistas)
+        actualizadas = []
+        for clase, xyxy in cajas:
+            mejor, mejor_iou = None, self.iou_min
+            for pista in libres:
+                if pista.clase != clase:
+                    continue
+                valor = iou(pista.xyxy, xyxy)
+                if valor >= mejor_iou:
+                    mejor, mejor_iou = pista, valor
+            if mejor is None:
+                mejor = Pista(self.siguiente_id, clase, xyxy, frame_n)
+                self.siguiente_id += 1
+                self.pistas.append(mejor)
+            else:
+                libres.remove(mejor)
+                mejor.xyxy = xyxy
+                mejor.ultimo_frame = frame_n
+            actualizadas.append(mejor)
+
+        self.pistas = [p for p in self.pistas if frame_n - p.ultimo_frame <= self.max_perdida]
+        if not self.pistas and (self.votos or self.identificada):
+            self.reiniciar()
+        return actualizadas
+
+    def votar(self, caja, text):
+        """Suma el voto de una lectura: un código legible vale doble que un nombre"""
+        if caja.clase == 'card_code':
+            card = self.scanner.catalogo.buscar_codigo(leer_codigo(text)) if leer_codigo(text) else None
+            if card:
+                self.votos[card['code']] += 2
+            return
+        catalogo = self.scanner.catalogo
+        ranking = catalogo.indice_nombres.buscar(text, min_sim=0.6, top_k=1)
+        if ranking:
+            card_id, _, score, _ = ranking[0]
+            self.votos[catalogo.cartas[card_id]['code']] += score
+
+    def decidir(self):
+        """Devuelve el código ganador si supera votos_min y saca ventaja al segundo"""
+        if not self.votos:
+            return None
+        (code, votos), *resto = self.votos.most_common(2)
+        segundo = resto[0][1] if resto else 0
+        if votos >= self.votos_min and votos >= 2 * segundo:
+            return code
+        return None
+
+    def rois(self, frame, pistas):
+        h, w = frame.shape[:2]
+        pad = self.scanner.pad
+        return [(max(p.xyxy[0] - pad, 0), max(p.xyxy[1] - pad, 0), min(p.xyxy[2] + pad, w), min(p.xyxy[3] + pad, h))
+                for p in pistas]
+
+    def verificar(self, frame, pistas):
+        """Relee el código de la carta identificada cada `verificar_cada` muestras.
+
+        Si un código legible y conocido no coincide con la carta identificada,
+        se descarta la identificación y ese código cuenta como primer voto.
+        """
+        self.muestras_identificada += 1
+        if self.muestras_identificada % self.verificar_cada:
+            return
+        codigos = [p for p in pistas if p.clase == 'card_code']
+        if not codigos:
+            return
+        for text in self.scanner.leer_cajas(frame, self.rois(frame, codigos)):
+            code = leer_codigo(text) if text else None
+            card = self.scanner.catalogo.buscar_codigo(code) if code else None
+            if card and card['code'] != self.identificada:
+                self.reiniciar()
+                self.votos[card['code']] += 2
+                return
+
+    def reiniciar(self):
+        """Olvida la carta actual y vuelve a leer todas las pistas"""
+        self.votos.clear()
+        self.identificada = None
+        self.muestras_identificada = 0
+        for pista in self.pistas:
+            pista.lecturas = 0
+
+    def procesar_frame(self, frame, frame_n):
+        """Detecta, sigue y lee las cajas de un frame muestreado; devuelve un evento si se identificó una carta"""
+        results = self.scanner.detectar([frame])[0]
+        cajas = []
+        if results.boxes is not None:
+            for box in results.boxes:
+                cajas.append((self.scanner.nombre_clase(int(box.cls[0])), tuple(map(int, box.xyxy[0]))))
+        pistas = self.actualizar_pistas(cajas, frame_n)
+
+        if self.identificada:
+            self.verificar(frame, pistas)
+            return None
+
+        por_leer = [p for p in pistas if p.clase in CLASES_PRIORITARIAS and p.lecturas < self.lecturas_max]
+        if not por_leer:
+            return None
+        for pista, text in zip(por_leer, self.scanner.leer_cajas(frame, self.rois(frame, por_leer))):
+            pista.lecturas += 1
+            if text:
+                self.votar(pista, text)
+
+        code = self.decidir()
+        if code is None:
+            return None
+        self.identificada = code
+        card = self.scanner.catalogo.buscar_codigo(code)
+        return {
+            "frame": frame_n,
+            "code": code,
+            "name": card.get('name') if card else None,
+            "votos": round(self.votos[code], 2),
+            "total_votos": round(sum(self.votos.values()), 2)
+        }
+
+    def dibujar(self, frame):
+        for pista in self.pistas:
+            x1, y1, x2, y2 = pista.xyxy
+            color = (0, 200, 0) if self.identificada else (0, 165, 255)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(frame, pista.clase, (x1, max(y1 - 5, 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        if self.identificada:
+            card = self.scanner.catalogo.buscar_codigo(self.identificada)
+            cv2.putText(frame, f"{self.identificada} {card.get('name') or ''}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 200, 0), 2)
+        return frame
+
+    def escanear(self, source, mostrar=False):
+        """Lee frames de un archivo de vídeo o dispositivo y va entregando los eventos de identificación"""
+        cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+        if not cap.isOpened():
+            raise IOError(f"No se pudo abrir la fuente de vídeo: {source}")
+        frame_n = 0
+        try:
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                if frame_n % self.cada == 0:
+                    evento = self.procesar_frame(frame, frame_n)
+                    if evento:
+                        yield evento
+                if mostrar:
+                    cv2.imshow("Escáner de cartas", self.dibujar(frame))
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+                frame_n += 1
+        finally:
+            cap.release()
+            if mostrar:
+                cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escáner de cartas en vídeo o webcam")
+    parser.add_argument('--source', required=True, help="Ruta al vídeo o índice de la cámara (p. ej. 0)")
+    parser.add_argument('--weights', required=True, help="Ruta al modelo entrenado (.pt, .onnx o carpeta *_openvino_model)")
+    parser.add_argument('--json', required=True, help="Ruta al archivo JSON de cartas")
+    parser.add_argument('--cada', type=int, default=5, help="Ejecutar YOLO cada N frames")
+    parser.add_argument('--votos', type=float, default=3, help="Votos necesarios para dar una carta por identificada")
+    parser.add_argument('--verificar', type=int, default=3,
+                        help="Releer el código de la carta identificada cada N frames muestreados")
+    parser.add_argument('--mostrar', action='store_true', help="Mostrar el vídeo con las cajas seguidas")
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text', help="Formato de los eventos")
+
+    args = parser.parse_args()
+
+    if not str(args.source).isdigit() and not os.path.exists(args.source):
+        print(f"❌ Error: El vídeo no existe: {args.source}", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.exists(args.weights):
+        print(f"❌ Error: El modelo no existe: {args.weights}", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.exists(args.json):
+        print(f"❌ Error: El archivo JSON no existe: {args.json}", file=sys.stderr)
+        sys.exit(1)
+
+    scanner = CardScanner(args.weights, args.json, log=silencio)
+    scanner.calentar()
+    video = VideoScanner(scanner, cada=args.cada, votos_min=args.votos, verificar_cada=args.verificar)
+
+    inicio = time.perf_counter()
+    for evento in video.escanear(args.source, mostrar=args.mostrar):
+        if args.format == 'jsonl':
+            print(json.dumps(evento, ensure_ascii=False), flush=True)
+        else:
+            print(f"🃏 Frame {evento['frame']}: {evento['code']} - {evento['name']} "
+                  f"({evento['votos']}/{evento['total_votos']} votos)")
+    print(f"⏱️ Vídeo procesado en {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
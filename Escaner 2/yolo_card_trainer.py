@@ -8,6 +8,8 @@ from ultralytics import YOLO
 from typing import List, Dict, Tuple
 import torch
 
+from card_layout import LAYOUT
+
 class YOLOCardTextTrainer:
     def __init__(self, cards_json_path: str, images_folder: str, dataset_path: str = "dataset"):
         self.cards_data = self.load_cards_data(cards_json_path)
@@ -52,17 +54,8 @@ class YOLOCardTextTrainer:
         h, w = img.shape[:2]
         boxes = []
 
-        # Define relative boxes (customized for layout like OOF cards)
-        layout = {
-            'card_name':     (0.10, 0.03, 0.80, 0.05),
-            'element_type':  (0.08, 0.72, 0.84, 0.035),
-            'species':       (0.08, 0.76, 0.45, 0.03),
-            'description':   (0.08, 0.81, 0.84, 0.10),
-            'stats':         (0.65, 0.91, 0.30, 0.05),
-            'card_code':     (0.80, 0.97, 0.18, 0.02)
-        }
-
-        for key, (x, y, bw, bh) in layout.items():
+        # Relative boxes for the OOF card layout (shared with the scanner's fixed-layout mode)
+        for key, (x, y, bw, bh) in LAYOUT.items():
             class_id = self.text_classes[key]
             abs_x = int(x * w)
             abs_y = int(y * h)